@@ -12,10 +12,13 @@ bl_info = {
 }
 
 
-import bpy, math, mathutils, copy
+import bpy, math, mathutils, copy, re, os, itertools, tempfile, random, json, sys, time, atexit, functools, hashlib
+import numpy as np
+from array import array
 from enum import Enum
 from math import radians
 from mathutils import Matrix, Vector
+from bpy.app.handlers import persistent
 
 
 def clear_material(material):
@@ -37,16 +40,1461 @@ def compare_vects(vec1, vec2, tol=0.1):
 	return True
 
 
+# Set material index of the faces facing directions[i] (within tol on every
+# component, like compare_vects) to i + 1, the other faces get index 0
+def assign_face_materials(mesh, directions, tol=0.2):
+	count = len(mesh.polygons)
+	normals = np.empty(count * 3, dtype=np.float32)
+	mesh.polygons.foreach_get("normal", normals)
+	normals = normals.reshape(count, 3)
+
+	indices = np.zeros(count, dtype=np.int32)
+	for i, direction in enumerate(directions, 1):
+		facing = np.all(np.abs(normals - np.array(direction, dtype=np.float32)) <= tol, axis=1)
+		indices[facing] = i
+
+	mesh.polygons.foreach_set("material_index", indices)
+	mesh.update()
+
+
+# Vertices and quads of a box with rounded edges: a cube grid with resolution quads
+# along every edge, pushed out from an inner box (half - radius) by radius like
+# a Shrinkwrap to the inner box with offset radius does
+def rounded_block(half=0.5, radius=0.25, resolution=16):
+	r = resolution
+	grid = np.indices((r + 1,) * 3).reshape(3, -1).T
+	grid = grid[((grid == 0) | (grid == r)).any(axis=1)]
+	index = np.full((r + 1,) * 3, -1, dtype=np.int32)
+	index[tuple(grid.T)] = np.arange(len(grid))
+
+	i, j = [values.ravel() for values in np.meshgrid(np.arange(r), np.arange(r), indexing='ij')]
+	quads = []
+	for a in range(3):
+		b, c = (a + 1) % 3, (a + 2) % 3
+		for side in (0, r):
+			corners = []
+			for di, dj in ((0, 0), (1, 0), (1, 1), (0, 1)):
+				coords = [None] * 3
+				coords[a], coords[b], coords[c] = np.full(r * r, side), i + di, j + dj
+				corners.append(index[tuple(coords)])
+			# Counterclockwise seen from outside, b x c points along +a
+			quads.append(np.stack(corners if side else corners[::-1], axis=1))
+
+	points = grid * (2 * half / r) - half
+	inner = np.clip(points, radius - half, half - radius)
+	offset = points - inner
+	length = np.linalg.norm(offset, axis=1, keepdims=True)
+	vertices = inner + np.divide(offset * radius, length, out=offset.copy(), where=length > 0)
+	return vertices.astype(np.float32), np.concatenate(quads).astype(np.int32)
+
+
+# Fill an empty mesh with quads without going through operators or from_pydata
+def load_quads(mesh, vertices, quads, smooth=True):
+	mesh.vertices.add(len(vertices))
+	mesh.loops.add(quads.size)
+	mesh.polygons.add(len(quads))
+
+	mesh.vertices.foreach_set("co", vertices.ravel())
+	mesh.loops.foreach_set("vertex_index", quads.ravel())
+	mesh.polygons.foreach_set("loop_start", np.arange(0, quads.size, 4, dtype=np.int32))
+	# Newer versions derive the polygon sizes from loop_start
+	if not mesh.polygons.bl_rna.properties["loop_total"].is_readonly:
+		mesh.polygons.foreach_set("loop_total", np.full(len(quads), 4, dtype=np.int32))
+	mesh.polygons.foreach_set("use_smooth", np.full(len(quads), smooth))
+	mesh.update(calc_edges=True)
+
+
+def is_surface(x, y, z, size):
+	return min(x, y, z) == 0 or max(x, y, z) == size - 1
+
+
+# Sticker colors of the cubie at (x, y, z) in solved cube, as keyword arguments for CubeBlockBuilder.color
+def sticker_colors(x, y, z, size):
+	colors = {}
+	if x == 0:
+		colors["left"] = "Red"
+	if x == size - 1:
+		colors["right"] = "Orange"
+	if y == 0:
+		colors["back"] = "Green"
+	if y == size - 1:
+		colors["forward"] = "Blue"
+	if z == 0:
+		colors["bottom"] = "White"
+	if z == size - 1:
+		colors["top"] = "Yellow"
+	return colors
+
+
 def round_vect(vec, digits):
 	return Vector((round(vec[0], digits), round(vec[1], digits), round(vec[2], digits)))
 
 
-def get_children(parent):
-	children = []
-	for obj in bpy.data.objects:
-		if obj.parent == parent:
-			children.append(obj)
-	return children
+# Cubies sit on an integer grid with axis aligned rotations, so transforms can be
+# rounded after every turn to get rid of accumulated float errors
+def snap_matrix(matrix):
+	rotation = Matrix([[round(value) for value in row] for row in matrix.to_3x3()]).to_4x4()
+	rotation.translation = [round(value) for value in matrix.translation]
+	return rotation
+
+
+def get_action(obj):
+	if obj.animation_data is None:
+		obj.animation_data_create()
+
+	if obj.animation_data.action is None:
+		obj.animation_data.action = bpy.data.actions.new(obj.name + "Action")
+
+	return obj.animation_data.action
+
+
+# Write keyframes in bulk, replacing keys from frames[0] onwards. Frames have to be sorted
+def write_keyframes(action, data_path, index, frames, values):
+	fcurve = action.fcurves.find(data_path, index=index)
+	if fcurve is None:
+		fcurve = action.fcurves.new(data_path, index=index, action_group="Object Transforms")
+
+	points = fcurve.keyframe_points
+	co = np.empty(2 * len(points), dtype=np.float32)
+	points.foreach_get("co", co)
+
+	# Keys are sorted by frame, the ones replaced are removed from the end so the
+	# indices of the others don't shift
+	start = int(np.searchsorted(co[0::2], frames[0]))
+	for i in range(len(points) - 1, start - 1, -1):
+		points.remove(points[i], fast=True)
+	points.add(len(frames))
+
+	new = np.empty((len(frames), 2), dtype=np.float32)
+	new[:, 0] = frames
+	new[:, 1] = values
+	points.foreach_set("co", np.concatenate((co[:2 * start], new.ravel())))
+
+	fcurve.update()
+
+
+###############################################################
+# Logical cube state (no bpy access) ##########################
+AXES = ('X', 'Y', 'Z')
+
+# Quarter turn about each axis - clockwise when looking from the positive end
+# of the axis, the same direction bpy.ops.transform.rotate uses for positive value
+_QUARTER_TURN_MATRICES = {
+	'X': ((1, 0, 0), (0, 0, 1), (0, -1, 0)),
+	'Y': ((0, 0, -1), (0, 1, 0), (1, 0, 0)),
+	'Z': ((0, 1, 0), (-1, 0, 0), (0, 0, 1))
+}
+
+
+def _multiply_int_matrices(a, b):
+	return tuple(tuple(sum(a[i][k] * b[k][j] for k in range(3)) for j in range(3)) for i in range(3))
+
+
+def _build_rotation_group():
+	identity = ((1, 0, 0), (0, 1, 0), (0, 0, 1))
+	rotations = [identity]
+	index = {identity: 0}
+
+	# All 24 orientations of a cubie are generated by the quarter turns
+	for rotation in rotations:
+		for turn in _QUARTER_TURN_MATRICES.values():
+			product = _multiply_int_matrices(turn, rotation)
+			if product not in index:
+				index[product] = len(rotations)
+				rotations.append(product)
+
+	products = [[index[_multiply_int_matrices(a, b)] for b in rotations] for a in rotations]
+
+	turns = {}
+	for axis, turn in _QUARTER_TURN_MATRICES.items():
+		turns[axis] = [0]
+		for i in range(3):
+			turns[axis].append(index[_multiply_int_matrices(turn, rotations[turns[axis][-1]])])
+
+	return tuple(rotations), index, products, turns
+
+
+# ROTATIONS[i] is an integer rotation matrix, ROTATION_INDEX maps the matrix back to i,
+# ROTATION_PRODUCTS[a][b] is the index of ROTATIONS[a] @ ROTATIONS[b] and
+# TURN_ROTATIONS[axis][q] is the index of q quarter turns
+ROTATIONS, ROTATION_INDEX, ROTATION_PRODUCTS, TURN_ROTATIONS = _build_rotation_group()
+
+
+# Cubies are numbered by their original position: x + y * size + z * size ** 2,
+# which is the order _build_cube creates them in. When only some of the cubies
+# exist (cubies argument), missing ones are -1 in positions and in grid.
+# layers[axis][layer] is the set of cubies in the layer, kept up to date on every turn
+class CubieState:
+	__slots__ = ('size', 'positions', 'grid', 'orientations', 'layers')
+
+	def __init__(self, size, cubies=None):
+		self.size = size
+		count = size ** 3
+
+		# cubie -> position index, position index -> cubie, cubie -> index in ROTATIONS
+		if cubies is None:
+			self.positions = array('i', range(count))
+			self.grid = array('i', range(count))
+		else:
+			self.positions = array('i', [-1]) * count
+			for cubie in cubies:
+				self.positions[cubie] = cubie
+			self.grid = array('i', self.positions)
+
+		self.orientations = array('B', bytes(count))
+		self._index_layers()
+
+	# Make state from (cubie, (x, y, z), orientation) items
+	@classmethod
+	def from_placements(cls, size, placements):
+		state = cls(size, ())
+		for cubie, (x, y, z), orientation in placements:
+			position = state.position_index(x, y, z)
+			state.positions[cubie] = position
+			state.grid[position] = cubie
+			state.orientations[cubie] = orientation
+
+		state._index_layers()
+		return state
+
+	def _index_layers(self):
+		self.layers = tuple([set() for i in range(self.size)] for axis in AXES)
+
+		for cubie, position in enumerate(self.positions):
+			if position != -1:
+				for axis_layers, layer in zip(self.layers, self.coords(cubie)):
+					axis_layers[layer].add(cubie)
+
+	def copy(self):
+		state = CubieState.__new__(CubieState)
+		state.size = self.size
+		state.positions = array('i', self.positions)
+		state.grid = array('i', self.grid)
+		state.orientations = array('B', self.orientations)
+		state.layers = tuple([set(cubies) for cubies in axis_layers] for axis_layers in self.layers)
+		return state
+
+	def position_index(self, x, y, z):
+		return x + (y + z * self.size) * self.size
+
+	def coords(self, cubie):
+		y, x = divmod(self.positions[cubie], self.size)
+		z, y = divmod(y, self.size)
+		return x, y, z
+
+	def layer_of(self, cubie, axis):
+		return self.coords(cubie)[AXES.index(axis)]
+
+	def layer_cubies(self, axis, layer):
+		return self.layers[AXES.index(axis)][layer]
+
+	# Turn the layer by quarter turns, positive turns are clockwise (see _QUARTER_TURN_MATRICES)
+	def apply_move(self, axis, layer, turns):
+		turns %= 4
+		if turns == 0:
+			return
+
+		axis_index = AXES.index(axis)
+		rotation = TURN_ROTATIONS[axis][turns]
+		matrix = ROTATIONS[rotation]
+		products = ROTATION_PRODUCTS[rotation]
+		n = self.size
+		offset = n - 1
+		moved = []
+
+		for cubie in self.layers[axis_index][layer]:
+			# Rotate doubled coordinates centered in the middle of the cube
+			old = self.coords(cubie)
+			u, v, w = 2 * old[0] - offset, 2 * old[1] - offset, 2 * old[2] - offset
+			new = ((matrix[0][0] * u + matrix[0][1] * v + matrix[0][2] * w + offset) // 2,
+				   (matrix[1][0] * u + matrix[1][1] * v + matrix[1][2] * w + offset) // 2,
+				   (matrix[2][0] * u + matrix[2][1] * v + matrix[2][2] * w + offset) // 2)
+
+			moved.append((cubie, new[0] + (new[1] + new[2] * n) * n))
+			self.orientations[cubie] = products[self.orientations[cubie]]
+
+			for other_axis in range(3):
+				if old[other_axis] != new[other_axis]:
+					self.layers[other_axis][old[other_axis]].discard(cubie)
+					self.layers[other_axis][new[other_axis]].add(cubie)
+
+		for cubie, position in moved:
+			self.positions[cubie] = position
+			self.grid[position] = cubie
+
+	def is_solved(self):
+		return all(self.positions[i] in (i, -1) and self.orientations[i] == 0 for i in range(len(self.positions)))
+
+
+# Face moves: axis, side the layers are counted from and turn direction for the face
+_FACE_MOVES = {
+	'R': ('X', 1, 1),
+	'L': ('X', 0, -1),
+	'B': ('Y', 1, 1),
+	'F': ('Y', 0, -1),
+	'U': ('Z', 1, 1),
+	'D': ('Z', 0, -1)
+}
+
+# Slice and whole cube moves: axis and turn direction
+_SLICE_MOVES = {'M': ('X', -1), 'S': ('Y', -1), 'E': ('Z', -1)}
+_CUBE_ROTATIONS = {'x': ('X', 1), 'z': ('Y', -1), 'y': ('Z', 1)}
+
+_MOVE_PATTERN = re.compile(r"(\d*)([URFDLBurfdlbMESxyz])(w?)(\d*)('?)$")
+
+
+# Parse moves in SiGN notation (R, U', F2, Rw, r, 3Rw, 3R, M, x...) into a list
+# of (axis, layers, turns) tuples, positive turns are clockwise like in CubieState
+def parse_moves(sequence, size):
+	moves = []
+
+	for token in sequence.split():
+		match = _MOVE_PATTERN.match(token)
+		if not match:
+			raise ValueError("Invalid move: " + token)
+
+		prefix, letter, wide, amount, prime = match.groups()
+		turns = int(amount) if amount else 1
+		if prime:
+			turns = -turns
+
+		if letter in _CUBE_ROTATIONS:
+			axis, direction = _CUBE_ROTATIONS[letter]
+			layers = tuple(range(size))
+		elif letter in _SLICE_MOVES:
+			axis, direction = _SLICE_MOVES[letter]
+			layers = tuple(range(1, size - 1))
+		else:
+			if letter.islower():
+				letter = letter.upper()
+				wide = 'w'
+
+			axis, side, direction = _FACE_MOVES[letter]
+			depth = int(prefix) if prefix else (2 if wide else 1)
+			if depth < 1 or depth > size:
+				raise ValueError("Invalid move: " + token)
+
+			# Wide moves turn all the outer layers, otherwise the prefix picks a single layer
+			if wide:
+				layers = tuple(range(depth))
+			else:
+				layers = (depth - 1,)
+
+			if side == 1:
+				layers = tuple(size - 1 - layer for layer in layers)
+
+		if turns % 4:
+			moves.append((axis, layers, direction * turns))
+
+	return moves
+
+
+# Faces in URFDLB order (the usual order of facelet strings) and their outward
+# normals, the front of the cube is the -Y side like in Blender's front view
+FACES = 'URFDLB'
+FACE_NORMALS = ((0, 0, 1), (1, 0, 0), (0, -1, 0), (0, 0, -1), (-1, 0, 0), (0, 1, 0))
+_NORMAL_FACES = {normal: face for face, normal in enumerate(FACE_NORMALS)}
+
+_FACELET_LAYOUTS = {}
+
+
+# Facelet index is face * size ** 2 + row * size + col, rows and columns as seen
+# when looking at the face with U on top (with B on top for U and F on top for D).
+# Returns (x, y, z, face) of every facelet and a dict mapping them back to the index
+def facelet_layout(size):
+	if size not in _FACELET_LAYOUTS:
+		m = size - 1
+		places = []
+
+		for face in range(6):
+			for row in range(size):
+				for col in range(size):
+					places.append(((col, m - row, m), (m, col, m - row), (col, 0, m - row),
+								   (col, row, 0), (0, m - col, m - row), (m - col, m, m - row))[face] + (face,))
+
+		_FACELET_LAYOUTS[size] = (places, {place: index for index, place in enumerate(places)})
+
+	return _FACELET_LAYOUTS[size]
+
+
+# Color of every facelet of the state, colors are the indices of faces in FACES
+def facelet_colors(state):
+	n = state.size
+	places, facelet_index = facelet_layout(n)
+	colors = bytearray(len(places))
+
+	for cubie, position in enumerate(state.positions):
+		if position == -1:
+			continue
+
+		home = (cubie % n, cubie // n % n, cubie // (n * n))
+		coords = state.coords(cubie)
+		matrix = ROTATIONS[state.orientations[cubie]]
+
+		for face, normal in enumerate(FACE_NORMALS):
+			axis = (2, 0, 1, 2, 0, 1)[face]
+			if home[axis] != (n - 1 if normal[axis] > 0 else 0):
+				continue
+
+			turned = tuple(row[0] * normal[0] + row[1] * normal[1] + row[2] * normal[2] for row in matrix)
+			colors[facelet_index[coords + (_NORMAL_FACES[turned],)]] = face
+
+	return colors
+
+
+_MOVE_PERMUTATIONS = {}
+
+
+# Sticker permutation of a quarter turns of a layer: stickers[permutation] are the
+# stickers after the move. Built from facelet_layout once per size and move
+def move_permutation(size, axis, layer, turns):
+	key = (size, axis, layer, turns % 4)
+	if key not in _MOVE_PERMUTATIONS:
+		places, facelet_index = facelet_layout(size)
+		axis_index = AXES.index(axis)
+		matrix = ROTATIONS[TURN_ROTATIONS[axis][turns % 4]]
+		offset = size - 1
+		permutation = np.arange(len(places))
+
+		for source, (x, y, z, face) in enumerate(places):
+			if (x, y, z)[axis_index] != layer:
+				continue
+
+			# Same doubled coordinates as CubieState.apply_move, the face normal turns too
+			u, v, w = 2 * x - offset, 2 * y - offset, 2 * z - offset
+			coords = tuple((row[0] * u + row[1] * v + row[2] * w + offset) // 2 for row in matrix)
+			normal = FACE_NORMALS[face]
+			turned = tuple(row[0] * normal[0] + row[1] * normal[1] + row[2] * normal[2] for row in matrix)
+			permutation[facelet_index[coords + (_NORMAL_FACES[turned],)]] = source
+
+		_MOVE_PERMUTATIONS[key] = permutation
+
+	return _MOVE_PERMUTATIONS[key]
+
+
+# One permutation doing all the (axis, layers, turns) moves
+def sequence_permutation(size, moves):
+	permutation = np.arange(6 * size * size)
+	for axis, layers, turns in moves:
+		for layer in layers:
+			permutation = permutation[move_permutation(size, axis, layer, turns)]
+	return permutation
+
+
+# The cube as its 6 * size ** 2 stickers (layout of facelet_layout) in a uint8 array
+# of colors, a move is one gather with its permutation. Unlike CubieState it
+# doesn't know cubies, only how the cube looks
+class CubeState:
+	__slots__ = ('size', 'stickers')
+
+	def __init__(self, size, stickers=None):
+		self.size = size
+		if stickers is None:
+			stickers = np.repeat(np.arange(6, dtype=np.uint8), size * size)
+		self.stickers = stickers
+
+	@classmethod
+	def from_cubie_state(cls, state):
+		return cls(state.size, np.frombuffer(facelet_colors(state), dtype=np.uint8).copy())
+
+	def copy(self):
+		return CubeState(self.size, self.stickers.copy())
+
+	def apply_permutation(self, permutation):
+		self.stickers = self.stickers[permutation]
+		return self
+
+	def apply_moves(self, moves):
+		return self.apply_permutation(sequence_permutation(self.size, moves))
+
+	def apply_sequence(self, sequence):
+		return self.apply_moves(parse_moves(sequence, self.size))
+
+	def faces(self):
+		return self.stickers.reshape(6, self.size, self.size)
+
+	# Every face in one color, in any orientation of the whole cube
+	def is_solved(self):
+		faces = self.stickers.reshape(6, -1)
+		return bool((faces == faces[:, :1]).all()) and len(set(faces[:, 0].tolist())) == 6
+
+	# Checks what can be seen from the stickers: every color size ** 2 times, corners
+	# that exist on a real cube and for 3x3 also twist, flip and parity
+	def is_valid(self):
+		n = self.size
+		if self.stickers.max() > 5 or (np.bincount(self.stickers, minlength=6) != n * n).any():
+			return False
+
+		solved = CubeState(n)
+		places, facelet_index = facelet_layout(n)
+		corners = []
+		for x in (0, n - 1):
+			for y in (0, n - 1):
+				for z in (0, n - 1):
+					corners.append([facelet_index[(x, y, z, face)] for face in range(6)
+									if (x, y, z, face) in facelet_index])
+
+		if sorted(sorted(self.stickers[corner].tolist()) for corner in corners) != \
+				sorted(sorted(solved.stickers[corner].tolist()) for corner in corners):
+			return False
+
+		if n == 3:
+			try:
+				cubie_cube_from_facelets(self.stickers.tolist())
+			except ValueError:
+				return False
+
+		return True
+
+	def __eq__(self, other):
+		return isinstance(other, CubeState) and self.size == other.size and \
+			bool((self.stickers == other.stickers).all())
+
+
+###############################################################
+# Two-phase solver for 3x3 (no bpy access) ####################
+# Kociemba's cubie level: the cube is (cp, co, ep, eo), cp[i] is the corner at
+# corner position i and co[i] its twist, the same for edges. Corners are URF, UFL,
+# ULB, UBR, DFR, DLF, DBL, DRB and edges UR, UF, UL, UB, DR, DF, DL, DB, FR, FL,
+# BL, BR. These are their facelets on 3x3, U or D facelet (F or B for FR...BR) first
+_CORNER_FACELETS = ((8, 9, 20), (6, 18, 38), (0, 36, 47), (2, 45, 11),
+					(29, 26, 15), (27, 44, 24), (33, 53, 42), (35, 17, 51))
+_EDGE_FACELETS = ((5, 10), (7, 19), (3, 37), (1, 46), (32, 16), (28, 25),
+				  (30, 43), (34, 52), (23, 12), (21, 41), (50, 39), (48, 14))
+
+_CORNER_KEYS = {(facelets[1] // 9, facelets[2] // 9): i for i, facelets in enumerate(_CORNER_FACELETS)}
+_EDGE_KEYS = {(facelets[0] // 9, facelets[1] // 9): i for i, facelets in enumerate(_EDGE_FACELETS)}
+
+# Moves are face * 3 + power, power 0, 1, 2 is quarter, half and inverse turn.
+# Phase 2 keeps the cube in <U, D, R2, L2, F2, B2>
+PHASE2_MOVES = (0, 1, 2, 9, 10, 11, 4, 13, 7, 16)
+
+_SLICE_COMBINATIONS = list(itertools.combinations(range(12), 4))
+_SLICE_INDEX = {combination: i for i, combination in enumerate(_SLICE_COMBINATIONS)}
+SOLVED_SLICE = _SLICE_INDEX[(8, 9, 10, 11)]
+
+# Size of coordinates: twist, flip, slice, corner permutation, U and D edge permutation, slice permutation
+_N_TWIST, _N_FLIP, _N_SLICE, _N_PERM, _N_SLICE_PERM = 2187, 2048, 495, 40320, 24
+
+
+def _permutation_parity(permutation):
+	return sum(a > b for i, a in enumerate(permutation) for b in permutation[i + 1:]) % 2
+
+
+# Cubie level cube from facelet colors of a 3x3, the colors are taken relative to
+# the centers so slice moves and whole cube rotations don't matter. Without check
+# twist, flip and parity aren't checked
+def cubie_cube_from_facelets(colors, check=True):
+	face_of_color = {colors[9 * face + 4]: face for face in range(6)}
+	if len(face_of_color) != 6:
+		raise ValueError("Invalid cube: centers have the same color")
+	facelets = [face_of_color[color] for color in colors]
+	cp, co, ep, eo = [], [], [], []
+
+	for corner in _CORNER_FACELETS:
+		for twist in range(3):
+			if facelets[corner[twist]] in (0, 3):
+				break
+		else:
+			raise ValueError("Invalid cube: corner without U or D color")
+
+		key = (facelets[corner[(twist + 1) % 3]], facelets[corner[(twist + 2) % 3]])
+		if key not in _CORNER_KEYS:
+			raise ValueError("Invalid cube: unknown corner")
+		cp.append(_CORNER_KEYS[key])
+		co.append(twist)
+
+	for edge in _EDGE_FACELETS:
+		key = (facelets[edge[0]], facelets[edge[1]])
+		if key in _EDGE_KEYS:
+			ep.append(_EDGE_KEYS[key])
+			eo.append(0)
+		elif key[::-1] in _EDGE_KEYS:
+			ep.append(_EDGE_KEYS[key[::-1]])
+			eo.append(1)
+		else:
+			raise ValueError("Invalid cube: unknown edge")
+
+	if sorted(cp) != list(range(8)) or sorted(ep) != list(range(12)):
+		raise ValueError("Invalid cube: repeated cubies")
+	if check and (sum(co) % 3 or sum(eo) % 2 or _permutation_parity(cp) != _permutation_parity(ep)):
+		raise ValueError("Invalid cube: unsolvable twist, flip or parity")
+
+	return cp, co, ep, eo
+
+
+# Cube a followed by cube b
+def multiply_cubie_cubes(a, b):
+	a_cp, a_co, a_ep, a_eo = a
+	b_cp, b_co, b_ep, b_eo = b
+	return ([a_cp[i] for i in b_cp],
+			[(a_co[b_cp[i]] + b_co[i]) % 3 for i in range(8)],
+			[a_ep[i] for i in b_ep],
+			[(a_eo[b_ep[i]] + b_eo[i]) % 2 for i in range(12)])
+
+
+_MOVE_CUBES = []
+
+
+# The 18 moves on cubie level, made by turning a CubieState so they use the same
+# conventions as the rest of the addon
+def move_cubes():
+	if not _MOVE_CUBES:
+		for face in FACES:
+			(axis, layers, turns), = parse_moves(face, 3)
+			for power in range(1, 4):
+				state = CubieState(3)
+				state.apply_move(axis, layers[0], turns * power)
+				_MOVE_CUBES.append(cubie_cube_from_facelets(facelet_colors(state)))
+
+	return _MOVE_CUBES
+
+
+def _rank_permutations(permutations):
+	# Lexicographic rank of every row, itertools.permutations order
+	count = permutations.shape[1]
+	smaller = permutations[:, None, :] < permutations[:, :, None]
+	smaller &= np.triu(np.ones((count, count), dtype=bool), 1)
+	factorials = np.array([math.factorial(count - 1 - i) for i in range(count)])
+	return smaller.sum(axis=2) @ factorials
+
+
+def _rank_permutation(permutation):
+	rank = 0
+	for i, value in enumerate(permutation):
+		rank += sum(other < value for other in permutation[i + 1:]) * math.factorial(len(permutation) - 1 - i)
+	return rank
+
+
+def _twist(co):
+	value = 0
+	for twist in co[:7]:
+		value = 3 * value + twist
+	return value
+
+
+def _flip(eo):
+	value = 0
+	for flip in eo[:11]:
+		value = 2 * value + flip
+	return value
+
+
+def _slice(ep):
+	return _SLICE_INDEX[tuple(i for i, edge in enumerate(ep) if edge >= 8)]
+
+
+def _phase2_coordinates(cube):
+	cp, co, ep, eo = cube
+	return _rank_permutation(cp), _rank_permutation(ep[:8]), _rank_permutation([edge - 8 for edge in ep[8:]])
+
+
+# Breadth first search over pairs of coordinates, depth of every pair in a uint8 array
+def _pruning_table(move_a, move_b, start):
+	move_a, move_b = move_a.astype(np.int64), move_b.astype(np.int64)
+	size_b = len(move_b)
+	table = np.full(len(move_a) * size_b, 255, dtype=np.uint8)
+	table[start] = 0
+	frontier = np.array([start])
+	depth = 0
+
+	while frontier.size:
+		depth += 1
+		following = (move_a[frontier // size_b] * size_b + move_b[frontier % size_b]).ravel()
+		following = np.unique(following[table[following] == 255])
+		table[following] = depth
+		frontier = following
+
+	return table
+
+
+# Move and pruning tables of the two-phase search, move tables are
+# coordinate * number of moves + move
+def build_solver_tables():
+	cubes = move_cubes()
+	tables = {}
+
+	# Phase 1 coordinates under all 18 moves
+	digits = np.arange(_N_TWIST)[:, None] // 3 ** np.arange(6, -1, -1) % 3
+	co = np.hstack([digits, (-digits.sum(axis=1) % 3)[:, None]])
+	tables['twist_move'] = np.stack([(co[:, cp] + move_co)[:, :7] % 3 @ 3 ** np.arange(6, -1, -1)
+									 for cp, move_co, ep, eo in cubes], axis=1)
+
+	digits = np.arange(_N_FLIP)[:, None] // 2 ** np.arange(10, -1, -1) % 2
+	eo = np.hstack([digits, (digits.sum(axis=1) % 2)[:, None]])
+	tables['flip_move'] = np.stack([(eo[:, ep] + move_eo)[:, :11] % 2 @ 2 ** np.arange(10, -1, -1)
+									for cp, co, ep, move_eo in cubes], axis=1)
+
+	occupied = np.zeros((_N_SLICE, 12), dtype=np.int64)
+	for i, combination in enumerate(_SLICE_COMBINATIONS):
+		occupied[i, list(combination)] = 1
+	mask_index = np.zeros(4096, dtype=np.int64)
+	mask_index[occupied @ 2 ** np.arange(12)] = np.arange(_N_SLICE)
+	tables['slice_move'] = np.stack([mask_index[occupied[:, ep] @ 2 ** np.arange(12)]
+									 for cp, co, ep, eo in cubes], axis=1)
+
+	# Phase 2 coordinates under PHASE2_MOVES
+	phase2_cubes = [cubes[move] for move in PHASE2_MOVES]
+	permutations = np.array(list(itertools.permutations(range(8))))
+	tables['corner_perm_move'] = np.stack([_rank_permutations(permutations[:, cp])
+										   for cp, co, ep, eo in phase2_cubes], axis=1)
+	tables['edge_perm_move'] = np.stack([_rank_permutations(permutations[:, ep[:8]])
+										 for cp, co, ep, eo in phase2_cubes], axis=1)
+	permutations = np.array(list(itertools.permutations(range(4))))
+	tables['slice_perm_move'] = np.stack([_rank_permutations(permutations[:, np.array(ep[8:]) - 8])
+										  for cp, co, ep, eo in phase2_cubes], axis=1)
+
+	tables = {name: table.astype(np.uint16) for name, table in tables.items()}
+
+	tables['twist_slice_prune'] = _pruning_table(tables['twist_move'], tables['slice_move'], SOLVED_SLICE)
+	tables['flip_slice_prune'] = _pruning_table(tables['flip_move'], tables['slice_move'], SOLVED_SLICE)
+	tables['corner_slice_prune'] = _pruning_table(tables['corner_perm_move'], tables['slice_perm_move'], 0)
+	tables['edge_slice_prune'] = _pruning_table(tables['edge_perm_move'], tables['slice_perm_move'], 0)
+
+	return {name: table.ravel() for name, table in tables.items()}
+
+
+# Bump when the tables or the way they are built change, old cache files are ignored
+SOLVER_TABLES_VERSION = 1
+
+# Length and type of every table, a cached file that doesn't match is built again
+SOLVER_TABLE_LAYOUT = {
+	'twist_move': (_N_TWIST * 18, np.uint16),
+	'flip_move': (_N_FLIP * 18, np.uint16),
+	'slice_move': (_N_SLICE * 18, np.uint16),
+	'corner_perm_move': (_N_PERM * 10, np.uint16),
+	'edge_perm_move': (_N_PERM * 10, np.uint16),
+	'slice_perm_move': (_N_SLICE_PERM * 10, np.uint16),
+	'twist_slice_prune': (_N_TWIST * _N_SLICE, np.uint8),
+	'flip_slice_prune': (_N_FLIP * _N_SLICE, np.uint8),
+	'corner_slice_prune': (_N_PERM * _N_SLICE_PERM, np.uint8),
+	'edge_slice_prune': (_N_PERM * _N_SLICE_PERM, np.uint8)
+}
+
+
+# Solver tables kept as .npy files in a directory and memory-mapped read-only, so
+# Blender instances using the same directory share one copy of them. Nothing is
+# read before the first solve, the tables are built and saved when missing
+class SolverTableCache:
+	def __init__(self, directory=None):
+		self.directory = directory if directory else tempfile.gettempdir()
+		self._solver = None
+		self._reduction_tables = {}
+
+	def path(self, name):
+		return os.path.join(self.directory, "rubik_solver_v" + str(SOLVER_TABLES_VERSION) + "_" + name + ".npy")
+
+	def solver(self):
+		if self._solver is None:
+			tables = self.load()
+			if tables is None:
+				tables = build_solver_tables()
+				self.save(tables)
+				# Map the saved files, the built tables are only used if saving failed
+				tables = self.load() or tables
+
+			self._solver = TwoPhaseSolver(tables)
+
+		return self._solver
+
+	# Table of build_reduction_table for the size, built and saved the first time
+	def reduction_table(self, size):
+		if size not in self._reduction_tables:
+			name = "reduction" + str(size)
+			try:
+				table = np.load(self.path(name))
+			except (OSError, ValueError):
+				table = None
+
+			if table is None or table.ndim != 2 or table.shape[1] != 12 or table.dtype != np.int16:
+				table = build_reduction_table(size)
+				self.save({name: table})
+			self._reduction_tables[size] = table
+
+		return self._reduction_tables[size]
+
+	def load(self):
+		tables = {}
+		for name, (length, dtype) in SOLVER_TABLE_LAYOUT.items():
+			try:
+				table = np.load(self.path(name), mmap_mode='r')
+			except (OSError, ValueError):
+				return None
+
+			if table.shape != (length,) or table.dtype != dtype:
+				return None
+			tables[name] = table
+
+		return tables
+
+	def save(self, tables):
+		try:
+			os.makedirs(self.directory, exist_ok=True)
+			for name, table in tables.items():
+				# Written under a temporary name and renamed, other instances never
+				# see a file that is half written
+				temp_path = self.path(name) + "." + str(os.getpid()) + ".tmp"
+				with open(temp_path, 'wb') as file:
+					np.save(file, table)
+				os.replace(temp_path, self.path(name))
+		except OSError:
+			pass
+
+
+# register() points it to the addon's config directory
+solver_tables = SolverTableCache()
+
+
+# Kociemba's two-phase algorithm: phase 1 brings the cube to <U, D, R2, L2, F2, B2>
+# (no twist, no flip, slice edges in the slice), phase 2 solves it with these moves.
+# Both are IDA* with the pruning tables as heuristic
+class TwoPhaseSolver:
+	def __init__(self, tables):
+		# memoryview indexing returns plain ints and is faster than indexing numpy arrays
+		for name, table in tables.items():
+			setattr(self, name, memoryview(np.ascontiguousarray(table)))
+
+	# List of moves (face * 3 + power) solving the cube, the first solution found
+	# with at most max_length moves
+	def solve(self, cube, max_length=24, phase2_max_length=12):
+		self.cube = cube
+		self.max_length = max_length
+		self.phase2_max_length = phase2_max_length
+		self.path = []
+		self.solution = None
+
+		twist, flip, slc = _twist(cube[1]), _flip(cube[3]), _slice(cube[2])
+		for depth in range(max_length + 1):
+			if self._phase1(twist, flip, slc, depth, -1):
+				return self.solution
+
+		return None
+
+	def _phase1(self, twist, flip, slc, depth, last_face):
+		if depth == 0:
+			# Ending with a phase 2 move means the shorter path was already tried
+			return (twist == 0 and flip == 0 and slc == SOLVED_SLICE and
+					(not self.path or self.path[-1] not in PHASE2_MOVES) and self._start_phase2())
+
+		path = self.path
+		for move in range(18):
+			face = move // 3
+			# Same face twice or opposite faces in both orders repeat the same states
+			if face == last_face or face == last_face - 3:
+				continue
+
+			new_twist = self.twist_move[18 * twist + move]
+			new_flip = self.flip_move[18 * flip + move]
+			new_slc = self.slice_move[18 * slc + move]
+			if (self.twist_slice_prune[_N_SLICE * new_twist + new_slc] >= depth or
+					self.flip_slice_prune[_N_SLICE * new_flip + new_slc] >= depth):
+				continue
+
+			path.append(move)
+			if self._phase1(new_twist, new_flip, new_slc, depth - 1, face):
+				return True
+			path.pop()
+
+		return False
+
+	def _start_phase2(self):
+		cube = self.cube
+		cubes = move_cubes()
+		for move in self.path:
+			cube = multiply_cubie_cubes(cube, cubes[move])
+
+		corners, edges, slc = _phase2_coordinates(cube)
+		last_face = self.path[-1] // 3 if self.path else -1
+		self.phase2_path = []
+
+		for depth in range(min(self.max_length - len(self.path), self.phase2_max_length) + 1):
+			if self._phase2(corners, edges, slc, depth, last_face):
+				self.solution = self.path + self.phase2_path
+				return True
+
+		return False
+
+	def _phase2(self, corners, edges, slc, depth, last_face):
+		if depth == 0:
+			return corners == 0 and edges == 0 and slc == 0
+
+		path = self.phase2_path
+		for i, move in enumerate(PHASE2_MOVES):
+			face = move // 3
+			if face == last_face or face == last_face - 3:
+				continue
+
+			new_corners = self.corner_perm_move[10 * corners + i]
+			new_edges = self.edge_perm_move[10 * edges + i]
+			new_slc = self.slice_perm_move[10 * slc + i]
+			if (self.corner_slice_prune[_N_SLICE_PERM * new_corners + new_slc] >= depth or
+					self.edge_slice_prune[_N_SLICE_PERM * new_edges + new_slc] >= depth):
+				continue
+
+			path.append(move)
+			if self._phase2(new_corners, new_edges, new_slc, depth - 1, face):
+				return True
+			path.pop()
+
+		return False
+
+
+# Whole cube rotations, every orientation of the cube is at most two of them away
+_CUBE_ROTATION_SEQUENCES = [''] + [first + suffix for first in 'xyz' for suffix in ('', '2', "'")]
+_CUBE_ROTATION_SEQUENCES += [first + ' ' + second for first in _CUBE_ROTATION_SEQUENCES[1:]
+							 for second in _CUBE_ROTATION_SEQUENCES[1:] if first[0] != second[0]]
+
+
+def apply_moves(state, moves):
+	for axis, layers, turns in moves:
+		for layer in layers:
+			state.apply_move(axis, layer, turns)
+	return state
+
+
+# Corners of a 2x2 state as a 3x3 with solved edges and centers. The centers are the
+# colors the corner at DBL has, so it stays in place. Odd corner permutation is made
+# solvable by swapping the FR and FL edges, the 2x2 doesn't have them
+def _corners_cube(state):
+	colors = facelet_colors(state)
+	colors_3x3 = bytearray(54)
+	for face in range(6):
+		for row in (0, 2):
+			for col in (0, 2):
+				colors_3x3[face * 9 + row * 3 + col] = colors[face * 4 + row + col // 2]
+
+	d, b, l = [colors_3x3[facelet] for facelet in _CORNER_FACELETS[6]]
+	centers = ((d + 3) % 6, (l + 3) % 6, (b + 3) % 6, d, l, b)
+	for face, color in enumerate(centers):
+		for facelet in (1, 3, 4, 5, 7):
+			colors_3x3[face * 9 + facelet] = color
+
+	cp, co, ep, eo = cubie_cube_from_facelets(colors_3x3, False)
+	if _permutation_parity(cp):
+		ep[8], ep[9] = ep[9], ep[8]
+	return cp, co, ep, eo
+
+
+# Two-phase search for the cubie level cube, played on the state (2x2 or 3x3 or the
+# outer layers of a bigger cube) and followed by whole cube rotations that put the
+# centers back, they may stay spun and that can't be seen so only colors are compared
+def _search_solution(state, cube, moves=()):
+	# Longer phase 2 is slow in Python and rarely needed, it's only the fallback
+	solver = solver_tables.solver()
+	search = solver.solve(cube) or solver.solve(cube, 30, 18)
+	if search is None:
+		raise ValueError("No solution found")
+
+	moves = list(moves) + parse_moves(' '.join(FACES[move // 3] + ('', '2', "'")[move % 3] for move in search), state.size)
+	solved = apply_moves(state.copy(), moves)
+	solved_colors = facelet_colors(CubieState(state.size))
+
+	for rotation in _CUBE_ROTATION_SEQUENCES:
+		rotation_moves = parse_moves(rotation, state.size)
+		if facelet_colors(apply_moves(solved.copy(), rotation_moves)) == solved_colors:
+			return format_moves(merge_moves(moves) + rotation_moves, state.size)
+
+	raise ValueError("No solution found")
+
+
+# Moves in SiGN notation solving a 3x3 or a 2x2 state (in colors). 2x2 is solved
+# as a 3x3 with solved edges, see _corners_cube
+def solve_state(state):
+	if state.size == 2:
+		return _search_solution(state, _corners_cube(state))
+	if state.size == 3:
+		return _search_solution(state, cubie_cube_from_facelets(facelet_colors(state)))
+
+	raise ValueError("Only 2x2 and 3x3 cubes can be searched for a solution")
+
+
+# Neighbouring turns of the same layers merged, the ones that cancel dropped
+def merge_moves(moves):
+	return invert_moves(invert_moves(moves))
+
+
+# Moves undoing the moves, neighbouring turns of the same layers are merged
+def invert_moves(moves):
+	inverted = []
+
+	for axis, layers, turns in reversed(moves):
+		turns = -turns
+		if inverted and inverted[-1][:2] == (axis, layers):
+			turns += inverted.pop()[2]
+
+		turns = (turns + 1) % 4 - 1
+		if turns:
+			inverted.append((axis, layers, turns))
+
+	return inverted
+
+
+# (axis, layers, turns) moves in SiGN notation, single layers are written from the
+# nearer face and the whole cube as x, y, z
+def format_moves(moves, size):
+	tokens = []
+	suffixes = ('', '', '2', "'")
+
+	for axis, layers, turns in moves:
+		if turns % 4 == 0:
+			continue
+		if len(layers) == size:
+			letter, direction = next((letter, direction) for letter, (rotation_axis, direction)
+									 in _CUBE_ROTATIONS.items() if rotation_axis == axis)
+			tokens.append(letter + suffixes[direction * turns % 4])
+			continue
+
+		for layer in layers:
+			side = 1 if size - layer < layer + 1 else 0
+			letter, (face_axis, face_side, direction) = next(item for item in _FACE_MOVES.items()
+															 if item[1][:2] == (axis, side))
+			depth = size - layer if side else layer + 1
+			tokens.append((str(depth) if depth > 1 else '') + letter + suffixes[direction * turns % 4])
+
+	return ' '.join(tokens)
+
+
+###############################################################
+# Reduction solver for bigger cubes (no bpy access) ###########
+# Centers and edge wings are put in place by commutators of single layer turns that
+# cycle three pieces and nothing else, which makes the cube a 3x3 solved by the
+# two-phase search. Odd permutations of the wings are fixed first by a quarter turn
+# of their inner layer, the 3x3 edges they are paired into are picked to be solvable
+
+# The commutator table grows fast with the size, 12x12 takes gigabytes to build
+REDUCTION_MAX_SIZE = 6
+
+# Single layer turns (axis, layer, amount) of the size and where they take the pieces,
+# destinations[turn][position]. inverse[turn] is the turn undoing it
+def _layer_turns(size):
+	turns = [(axis, layer, amount) for axis in AXES for layer in range(size) for amount in (1, 2, -1)]
+	destinations = []
+	for axis, layer, amount in turns:
+		state = CubieState(size)
+		state.apply_move(axis, layer, amount)
+		destinations.append(state.positions)
+
+	inverse = np.array([i - i % 3 + 2 - i % 3 for i in range(len(turns))])
+	return turns, np.array(destinations), inverse
+
+
+# Commutators [a b a', c] of single layer turns whose turned pieces overlap in just one
+# piece cycle three pieces and nothing else. Also their inverses and the ones set up by
+# one or two more turns (s C s', t s C s' t'), which gives every 3-cycle of an orbit of
+# centers or wings. A row is the sources and the targets of the three pieces (positions),
+# turns a, b, c, 1 for the inverse and the setup turns s and t or -1
+def build_reduction_table(size):
+	turns, destinations, inverse = _layer_turns(size)
+	count = len(turns)
+	identity = np.arange(size ** 3)
+	surface = np.array([is_surface(p % size, p // size % size, p // (size * size), size) for p in identity])
+	axes = np.arange(count) // (3 * size)
+	turned = ((destinations != identity) & surface).astype(np.int32)
+
+	rows = []
+	for a in range(count):
+		conjugates = destinations[inverse[a]][destinations[:, destinations[a]]]
+		overlaps = ((conjugates != identity) & surface).astype(np.int32) @ turned.T
+		b, c = np.nonzero(overlaps == 1)
+		b, c = b[axes[b] != axes[a]], c[axes[b] != axes[a]]
+
+		permutations = np.take_along_axis(destinations[c], conjugates[b], 1)
+		permutations = np.take_along_axis(conjugates[inverse[b]], permutations, 1)
+		permutations = np.take_along_axis(destinations[inverse[c]], permutations, 1)
+		moved = (permutations != identity) & surface
+		cycles = moved.sum(axis=1) == 3
+		sources = np.nonzero(moved[cycles])[1].reshape(-1, 3)
+		targets = np.take_along_axis(permutations[cycles], sources, 1)
+
+		base = np.column_stack([np.full(len(sources), a), b[cycles], c[cycles]])
+		rows.append(np.column_stack([sources, targets, base, np.zeros(len(sources), int)]))
+		order = np.argsort(targets, axis=1)
+		rows.append(np.column_stack([np.take_along_axis(targets, order, 1), np.take_along_axis(sources, order, 1),
+									 base, np.ones(len(sources), int)]))
+
+	# The same cycle is made in many ways, the first one (the shortest) is kept
+	def keys(rows):
+		return (rows[:, :6] * size ** (3 * np.arange(6))).sum(axis=1)
+
+	table = np.concatenate(rows)
+	table = np.column_stack([table, np.full((len(table), 2), -1)])
+	table = table[np.sort(np.unique(keys(table), return_index=True)[1])]
+	level = table
+	for column in (10, 11):
+		added = []
+		known = keys(table)
+		for setup in range(count):
+			# The cycle moving a to b moves s'(a) to s'(b) after s
+			moved = destinations[inverse[setup]][level[:, :6]]
+			order = np.argsort(moved[:, :3], axis=1)
+			moved = np.column_stack([np.take_along_axis(moved[:, :3], order, 1),
+									 np.take_along_axis(moved[:, 3:], order, 1), level[:, 6:]])
+			moved[:, column] = setup
+			moved = moved[~np.isin(keys(moved), known)]
+			moved = moved[np.sort(np.unique(keys(moved), return_index=True)[1])]
+			known = np.concatenate([known, keys(moved)])
+			added.append(moved)
+
+		level = np.concatenate(added)
+		table = np.concatenate([table, level])
+
+	return table.astype(np.int16)
+
+
+# Moves of a row of the reduction table
+def _cycle_moves(row, turns, inverse):
+	a, b, c, inverted = row[6:10]
+	sequence = [a, b, inverse[a], c, a, inverse[b], inverse[a], inverse[c]]
+	if inverted:
+		sequence = [inverse[turn] for turn in reversed(sequence)]
+	for setup in row[10:]:
+		if setup != -1:
+			sequence = [setup] + sequence + [inverse[setup]]
+
+	return [(turns[turn][0], (turns[turn][1],), turns[turn][2]) for turn in sequence]
+
+
+# Coordinates 0, size - 1 and the ones between as 0, 2 and 1 of a 3x3
+def _to_3x3(coords, size):
+	return tuple(0 if value == 0 else 2 if value == size - 1 else 1 for value in coords)
+
+
+_EDGES_3X3 = [p for p in range(27) if (p % 3, p // 3 % 3, p // 9).count(1) == 1]
+
+
+# Position a 3x3 cubie at home position goes to when turned by ROTATIONS[rotation]
+def _rotated_3x3(position, rotation):
+	home = (position % 3 - 1, position // 3 % 3 - 1, position // 9 - 1)
+	x, y, z = [sum(row[i] * home[i] for i in range(3)) + 1 for row in ROTATIONS[rotation]]
+	return x + 3 * y + 9 * z
+
+
+# Rotation of each 3x3 edge cubie (by home position) the wings are paired into. Odd
+# sizes pair them with the middle edges. Even sizes take the edges most wings are
+# paired into already and change them until the 3x3 with the corners is solvable
+def _edge_targets(state):
+	n = state.size
+	if n % 2:
+		targets = {}
+		for edge in _EDGES_3X3:
+			x, y, z = [(0, n // 2, n - 1)[value] for value in (edge % 3, edge // 3 % 3, edge // 9)]
+			targets[edge] = state.orientations[x + (y + z * n) * n]
+		return targets
+
+	votes = {}
+	for cubie, position in enumerate(state.positions):
+		home = (cubie % n, cubie // n % n, cubie // (n * n))
+		if position != -1 and _to_3x3(home, n).count(1) == 1:
+			x, y, z = _to_3x3(home, n)
+			key = (x + 3 * y + 9 * z, state.orientations[cubie])
+			votes[key] = votes.get(key, 0) + 1
+
+	targets, slots = {}, set()
+	for (edge, rotation), count in sorted(votes.items(), key=lambda item: -item[1]):
+		slot = _rotated_3x3(edge, rotation)
+		if edge not in targets and slot not in slots:
+			targets[edge] = rotation
+			slots.add(slot)
+
+	free_slots = [slot for slot in _EDGES_3X3 if slot not in slots]
+	for edge in [edge for edge in _EDGES_3X3 if edge not in targets]:
+		slot = free_slots.pop()
+		targets[edge] = next(rotation for rotation in range(24) if _rotated_3x3(edge, rotation) == slot)
+
+	def cube():
+		state_3x3 = CubieState(3)
+		for cubie, position in enumerate(state.positions):
+			home = _to_3x3((cubie % n, cubie // n % n, cubie // (n * n)), n)
+			if position != -1 and 1 not in home:
+				x, y, z = _to_3x3(state.coords(cubie), n)
+				state_3x3.positions[home[0] + 3 * home[1] + 9 * home[2]] = x + 3 * y + 9 * z
+				state_3x3.orientations[home[0] + 3 * home[1] + 9 * home[2]] = state.orientations[cubie]
+		for edge, rotation in targets.items():
+			state_3x3.positions[edge] = _rotated_3x3(edge, rotation)
+			state_3x3.orientations[edge] = rotation
+		return cubie_cube_from_facelets(facelet_colors(state_3x3), False)
+
+	def other_rotation(edge, slot, rotation):
+		return next(other for other in range(24) if _rotated_3x3(edge, other) == slot and other != rotation)
+
+	# Two edges swapped fix the permutation parity, one edge flipped the orientation
+	cp, co, ep, eo = cube()
+	if _permutation_parity(cp) != _permutation_parity(ep):
+		first, second = _EDGES_3X3[:2]
+		first_slot, second_slot = _rotated_3x3(first, targets[first]), _rotated_3x3(second, targets[second])
+		targets[first] = other_rotation(first, second_slot, None)
+		targets[second] = other_rotation(second, first_slot, None)
+		cp, co, ep, eo = cube()
+	if sum(eo) % 2:
+		first = _EDGES_3X3[0]
+		targets[first] = other_rotation(first, _rotated_3x3(first, targets[first]), targets[first])
+
+	return targets
+
+
+# Moves in SiGN notation solving a 4x4 or bigger state (in colors) by reduction
+def solve_reduction(state):
+	n = state.size
+	if not 4 <= n <= REDUCTION_MAX_SIZE:
+		raise ValueError("Only cubes from 4x4 to " + str(REDUCTION_MAX_SIZE) + "x" + str(REDUCTION_MAX_SIZE) +
+						 " are solved by reduction")
+
+	turns, destinations, inverse = _layer_turns(n)
+	table = solver_tables.reduction_table(n)
+	work = state.copy()
+	offset = n - 1
+	coords = np.array([(p % n, p // n % n, p // (n * n)) for p in range(n ** 3)])
+	extreme = (coords == 0) | (coords == offset)
+	kinds = extreme.sum(axis=1)
+	middle = coords * 2 == offset
+	wings = (kinds == 2) & ~middle.any(axis=1)
+	fixed = (kinds == 1) & (middle.sum(axis=1) == 2)
+	centers = (kinds == 1) & ~fixed
+
+	# Face of every center position, which is also the color of the piece from there
+	faces = np.full(n ** 3, -1)
+	for face, normal in enumerate(FACE_NORMALS):
+		axis = [abs(value) for value in normal].index(1)
+		faces[(kinds == 1) & (coords[:, axis] == (offset if normal[axis] > 0 else 0))] = face
+
+	# Where each wing goes, turned with the 3x3 edge it is paired into
+	wing_targets = np.full(n ** 3, -1)
+	for edge, rotation in _edge_targets(work).items():
+		matrix = np.array(ROTATIONS[rotation])
+		for wing in np.flatnonzero(wings):
+			if _to_3x3(coords[wing], n) == (edge % 3, edge // 3 % 3, edge // 9):
+				x, y, z = (matrix @ (coords[wing] * 2 - offset) + offset) // 2
+				wing_targets[wing] = x + (y + z * n) * n
+
+	# Positions the layer turns can take a piece to, numbered by their smallest position
+	orbits = np.arange(n ** 3)
+	while True:
+		merged = np.minimum(orbits, orbits[destinations].min(axis=0))
+		merged = merged[merged]
+		if (merged == orbits).all():
+			break
+		orbits = merged
+
+	moves = []
+	grid = np.array(work.grid)
+	for orbit in np.unique(orbits[wings]):
+		positions = np.flatnonzero(wings & (orbits == orbit))
+		index = {position: i for i, position in enumerate(positions)}
+		if _permutation_parity([index[wing_targets[grid[position]]] for position in positions]):
+			# A quarter turn of the inner layer cycles four wings of the orbit
+			axis = list(extreme[positions[0]]).index(False)
+			layer = int(coords[positions[0], axis])
+			work.apply_move(AXES[axis], layer, 1)
+			moves.append((AXES[axis], (layer,), 1))
+	grid = np.array(work.grid)
+
+	# Centers are solved to the colors of the fixed centers on odd sizes
+	colors = faces.copy()
+	if n % 2:
+		for face in range(6):
+			colors[faces == face] = faces[grid[np.flatnonzero(fixed & (faces == face))[0]]]
+
+	cycle_orbits = orbits[table[:, 0]]
+	lengths = 8 + 2 * (table[:, 10:] != -1).sum(axis=1)
+	for orbit in np.unique(orbits[centers | wings]):
+		rows = np.flatnonzero(cycle_orbits == orbit)
+		sources, targets = table[rows, :3], table[rows, 3:6]
+		positions = np.flatnonzero(orbits == orbit)
+		is_wing = wings[positions[0]]
+
+		while True:
+			if is_wing:
+				moved = wing_targets[grid[sources]]
+				gains = (moved == targets).sum(axis=1) - (moved == sources).sum(axis=1)
+				solved = (wing_targets[grid[positions]] == positions).all()
+			else:
+				moved = faces[grid[sources]]
+				gains = (colors[targets] == moved).sum(axis=1) - (colors[sources] == moved).sum(axis=1)
+				solved = (faces[grid[positions]] == colors[positions]).all()
+			if solved:
+				break
+
+			# Every 3-cycle of the orbit is in the table and one of them always puts at
+			# least one more piece in place, so this only stops when the orbit is solved
+			best = np.argmax(gains * 16 - lengths[rows])
+			if gains[best] <= 0:
+				raise ValueError("No solution found")
+			grid[targets[best]] = grid[sources[best]]
+			moves.extend(_cycle_moves(table[rows[best]], turns, inverse))
+
+	# Outer layers are a 3x3 now, the 3x3 facelets are the corner, one wing (or middle
+	# edge) and one center facelet of the big cube
+	colors = facelet_colors(apply_moves(state.copy(), moves))
+	inner = (0, n // 2 if n % 2 else 1, offset)
+	colors_3x3 = bytearray(colors[face * n * n + inner[row] * n + inner[col]]
+						   for face in range(6) for row in range(3) for col in range(3))
+	return _search_solution(state, cubie_cube_from_facelets(colors_3x3), moves)
+
+
+###############################################################
+# Scrambles (no bpy access) ###################################
+# Cubie level 3x3 picked uniformly from the solvable ones
+def random_cubie_cube(rng):
+	cp = list(range(8))
+	ep = list(range(12))
+	rng.shuffle(cp)
+	rng.shuffle(ep)
+	if _permutation_parity(cp) != _permutation_parity(ep):
+		ep[0], ep[1] = ep[1], ep[0]
+
+	co = [rng.randrange(3) for i in range(7)]
+	co.append(-sum(co) % 3)
+	eo = [rng.randrange(2) for i in range(11)]
+	eo.append(sum(eo) % 2)
+	return cp, co, ep, eo
+
+
+# Cubie level 3x3 with random corners and the edges solved, the 2x2 states. Odd
+# corner permutations are evened out by swapping FR and FL, like _corners_cube does
+def random_corners_cube(rng):
+	cp = list(range(8))
+	ep = list(range(12))
+	rng.shuffle(cp)
+	if _permutation_parity(cp):
+		ep[8], ep[9] = ep[9], ep[8]
+
+	co = [rng.randrange(3) for i in range(7)]
+	co.append(-sum(co) % 3)
+	return cp, co, ep, [0] * 12
+
+
+# Random state scramble for 3x3 and 2x2 (a 3x3 whose edges stay solved), the solution
+# of a random state played backwards
+def random_state_scramble(size, rng):
+	solver = solver_tables.solver()
+	while True:
+		cube = random_cubie_cube(rng) if size == 3 else random_corners_cube(rng)
+		moves = solver.solve(cube)
+		if moves is not None:
+			return ' '.join(FACES[move // 3] + ('', '2', "'")[2 - move % 3] for move in reversed(moves))
+
+
+# Random moves, moves of the same axis only follow each other in increasing layer
+# order so they don't cancel or repeat. Used for sizes without random state scrambles
+def random_move_scramble(size, rng, length=None):
+	if length is None:
+		length = 20 * (size - 2)
+
+	moves = []
+	last_axis, last_layer = None, -1
+	while len(moves) < length:
+		axis = rng.choice(AXES)
+		layer = rng.randrange(size)
+		if axis == last_axis and layer <= last_layer:
+			continue
+
+		moves.append((axis, (layer,), rng.choice((1, 2, -1))))
+		last_axis, last_layer = axis, layer
+
+	return format_moves(moves, size)
+
+
+# Generator of scrambles in SiGN notation, endless when count is None. Random state
+# for 2x2 and 3x3, random moves for bigger sizes
+def scrambles(size, count=None, seed=None):
+	rng = random.Random(seed)
+	generated = 0
+
+	while count is None or generated < count:
+		if size in (2, 3):
+			yield random_state_scramble(size, rng)
+		else:
+			yield random_move_scramble(size, rng)
+		generated += 1
+
+
+# Write count scrambles to a text file, one per line
+def write_scrambles(path, size, count, seed=None):
+	with open(path, 'w') as file:
+		for scramble in scrambles(size, count, seed):
+			file.write(scramble + "\n")
+
+###############################################################
+# Materials ###################################################
+# Colors of the blocks, the plastic is "Default"
+DEFAULT_COLORS = {
+	"Default": (0.0146095, 0.0146095, 0.0146095, 1),
+	"Yellow": (0.8, 0.680115, 0.0146383, 1),
+	"Red": (0.8, 0.00767614, 0.0320392, 1),
+	"Green": (0.0136964, 0.8, 0.11931, 1),
+	"Blue": (0.0468122, 0.0778236, 0.8, 1),
+	"Orange": (0.8, 0.180169, 0.0181465, 1),
+	"White": (0.564415, 0.462877, 0.468984, 1)
+}
+
+
+# Part of the hashes, bump it when MaterialRegistry.build changes so older materials are rebuilt
+MATERIALS_VERSION = 1
+
+
+# Hash of colors (a dict like DEFAULT_COLORS), small float differences e.g. from
+# a color property don't count
+def palette_hash(colors):
+	content = json.dumps([MATERIALS_VERSION] +
+						 sorted((key, [round(value, 5) for value in color]) for key, color in colors.items()))
+	return hashlib.sha1(content.encode()).hexdigest()[:12]
+
+
+# Block materials are built once and found again by the hash of their color kept in
+# the material (rubik_color_hash), in this session or in a saved file. Existing cubes
+# keep their materials untouched, so their shaders don't have to be compiled again.
+# The first color built for a key is "MaterialCube" + key, other colors for the key
+# (custom palettes) get "MaterialCube" + key + "_" + hash
+class MaterialRegistry:
+	def __init__(self):
+		# (key, hash) -> material name
+		self._names = {}
+
+	def _find(self, name, color_hash):
+		material = bpy.data.materials.get(name)
+		if material is not None and material.get("rubik_color_hash") == color_hash:
+			return material
+		return None
+
+	def material(self, key, color):
+		color_hash = palette_hash({key: color})
+		name = self._names.get((key, color_hash))
+		material = self._find(name, color_hash) if name else None
+
+		if material is None:
+			name = "MaterialCube" + key
+			material = self._find(name, color_hash)
+			if material is None:
+				material = self._find(name + "_" + color_hash, color_hash)
+
+		if material is None:
+			existing = bpy.data.materials.get(name)
+			# Materials of older versions have no hash and are rebuilt in place
+			if existing is not None and "rubik_color_hash" in existing:
+				name = name + "_" + color_hash
+				existing = None
+			material = existing if existing is not None else bpy.data.materials.new(name)
+			self.build(material, color)
+			material["rubik_color_hash"] = color_hash
+
+		self._names[(key, color_hash)] = material.name
+		return material
+
+	# Materials by "MaterialCube" + key for all colors of the palette
+	def materials(self, colors):
+		return {"MaterialCube" + key: self.material(key, color) for key, color in colors.items()}
+
+	def build(self, material, color):
+		material.use_nodes = True
+		clear_material(material)
+
+		output_node = material.node_tree.nodes.new(type="ShaderNodeOutputMaterial")
+		diffuse_node = material.node_tree.nodes.new(type="ShaderNodeBsdfDiffuse")
+		material.node_tree.links.new(diffuse_node.outputs["BSDF"], output_node.inputs["Surface"])
+		diffuse_node.inputs[0].default_value = color
+
+
+material_registry = MaterialRegistry()
 
 
 ###############################################################
@@ -59,12 +1507,14 @@ class CubeBlockBuilder:
 	def create(self, x, y, z):
 		pass
 
-	def color(self, cube_name, left = None, right = None, forward = None, back = None, top = None, bottom = None):
+	# Give the block object the sticker colors, keyword per direction it faces
+	def color(self, cube, left = None, right = None, forward = None, back = None, top = None, bottom = None):
 		pass
 
 
+# colors replaces some or all of DEFAULT_COLORS, e.g. {"White": (1, 1, 1, 1)}
 class PrimitiveCubeStrategy(CubeBlockBuilder):
-	def __init__(self, size = 0.9):
+	def __init__(self, size = 0.9, colors = None):
 		self.size = size
 
 		self.direction_dict = {
@@ -76,57 +1526,104 @@ class PrimitiveCubeStrategy(CubeBlockBuilder):
 			"bottom": mathutils.Vector((0, 0, -1))
 		}
 
-		# Create materials to use
-		self.color_dict = {
-			"Default": (0.0146095, 0.0146095, 0.0146095, 1),
-			"Yellow": (0.8, 0.680115, 0.0146383, 1),
-			"Red": (0.8, 0.00767614, 0.0320392, 1),
-			"Green": (0.0136964, 0.8, 0.11931, 1),
-			"Blue": (0.0468122, 0.0778236, 0.8, 1),
-			"Orange": (0.8, 0.180169, 0.0181465, 1),
-			"White": (0.564415, 0.462877, 0.468984, 1)
+		self.color_dict = dict(DEFAULT_COLORS)
+		if colors:
+			self.color_dict.update(colors)
+
+		# Materials to use by "MaterialCube" + color key, shared with the other cubes
+		self.material_dict = material_registry.materials(self.color_dict)
+
+	def create(self, x, y, z):
+		bpy.ops.mesh.primitive_cube_add(size=self.size, location=(x, y, z))
+
+	def color(self, cube, left = None, right = None, forward = None, back = None, top = None, bottom = None):
+		mesh = cube.data
+
+		colors_dict = {
+			"left": left,
+			"right": right,
+			"forward": forward,
+			"back": back,
+			"top": top,
+			"bottom": bottom
 		}
 
-		self.material_dict = {}
+		# Default color in the first slot, then one slot per sticker
+		mesh.materials.clear()
+		mesh.materials.append(self.material_dict["MaterialCubeDefault"])
+		directions = []
 
-		for key in self.color_dict:
-			material_name = "MaterialCube" + key
-			material = bpy.data.materials.get(material_name)
+		for key in colors_dict:
+			if colors_dict[key] != None:
+				mesh.materials.append(self.material_dict["MaterialCube" + colors_dict[key]])
+				directions.append(self.direction_dict[key])
 
-			if not material:
-				material = bpy.data.materials.new(material_name)
-			clear_material(material)
+		assign_face_materials(mesh, directions)
 
-			bpy.data.materials[material_name].use_nodes = True
-			material = bpy.data.materials[material_name]
 
-			output_node = material.node_tree.nodes.new(type="ShaderNodeOutputMaterial")
-			diffuse_node = material.node_tree.nodes.new(type="ShaderNodeBsdfDiffuse")
-			link_to_output = material.node_tree.links.new(diffuse_node.outputs["BSDF"], output_node.inputs["Surface"])
-			diffuse_node.inputs[0].default_value = self.color_dict[key]
-			material.use_nodes = True
+# Rounded blocks generated by rounded_block. The defaults look like the level 4 simple
+# subdivision shrinkwrapped to a half sized cube the blocks used to be made of, lower
+# resolution gives lighter blocks for the viewport and big cubes
+class FancyCubeStrategy(PrimitiveCubeStrategy):
+	def __init__(self, radius = 0.25, resolution = 16, colors = None):
+		super(FancyCubeStrategy, self).__init__(1, colors)
+		self.radius = radius
+		self.resolution = resolution
 
-			self.material_dict[material_name] = material
+	def new_mesh(self, name):
+		mesh = bpy.data.meshes.new(name)
+		# No radius is a plain cube, flat shaded
+		load_quads(mesh, *rounded_block(self.size / 2, self.radius, self.resolution), self.radius > 0)
+		return mesh
 
 	def create(self, x, y, z):
-		bpy.ops.mesh.primitive_cube_add(size=self.size, location=(x, y, z))
+		cube = bpy.data.objects.new("CubeName", self.new_mesh("CubeName"))
+		cube.location = (x, y, z)
+		bpy.context.collection.objects.link(cube)
+		bpy.context.view_layer.objects.active = cube
+
+
+# Rounded block mesh is built only once and shared by all the cubies,
+# stickers are set with per-object material slots
+class InstancedCubeStrategy(FancyCubeStrategy):
+	face_slots = ("left", "right", "forward", "back", "top", "bottom")
+
+	def __init__(self, radius = 0.25, resolution = 16, colors = None, size = 1):
+		super(InstancedCubeStrategy, self).__init__(radius, resolution, colors)
+		self.size = size
+		self.shared_mesh = None
+
+	# Shared mesh of plain cubes, what PrimitiveCubeStrategy makes
+	@classmethod
+	def plain(cls, size = 0.9, colors = None):
+		return cls(0, 1, colors, size)
 
-	def color(self, cube_name, left = None, right = None, forward = None, back = None, top = None, bottom = None):
-		bpy.context.view_layer.objects.active = bpy.data.objects[cube_name]
+	def _create_shared_mesh(self):
+		mesh = self.new_mesh("RubikCubeBlock")
 
-		# In edit mode
-		bpy.ops.object.editmode_toggle()
-		import bmesh
+		# Slot 0 is plastic, the next ones are stickers facing face_slots directions
+		mesh.materials.clear()
+		for i in range(len(self.face_slots) + 1):
+			mesh.materials.append(self.material_dict["MaterialCubeDefault"])
 
-		bpy.ops.mesh.select_all(action='SELECT')
-		mesh = bpy.context.object.data
+		assign_face_materials(mesh, [self.direction_dict[key] for key in self.face_slots])
+		self.shared_mesh = mesh
 
-		bmesh = bmesh.from_edit_mesh(mesh)
+	# Create block object without linking it to any collection
+	def new_object(self, name, location):
+		if self.shared_mesh is None:
+			self._create_shared_mesh()
 
-		# Default color
-		bpy.data.objects[cube_name].active_material = bpy.data.materials["MaterialCubeDefault"]
-		bpy.ops.mesh.select_all(action='DESELECT')
+		cube = bpy.data.objects.new(name, self.shared_mesh)
+		cube.location = location
+		return cube
 
+	def create(self, x, y, z):
+		cube = self.new_object("CubeName", (x, y, z))
+		bpy.context.collection.objects.link(cube)
+		bpy.context.view_layer.objects.active = cube
+
+	def color(self, cube, left = None, right = None, forward = None, back = None, top = None, bottom = None):
 		colors_dict = {
 			"left": left,
 			"right": right,
@@ -136,85 +1633,427 @@ class PrimitiveCubeStrategy(CubeBlockBuilder):
 			"bottom": bottom
 		}
 
-		index_dict = {}
-		material_index = 1
+		for i, key in enumerate(self.face_slots, 1):
+			if colors_dict[key] != None:
+				slot = cube.material_slots[i]
+				slot.link = 'OBJECT'
+				slot.material = self.material_dict["MaterialCube" + colors_dict[key]]
+
+
+# The whole cube is one object: a mesh with a vertex per cubie and a Geometry Nodes
+# modifier instancing the shared block on the vertices. Per vertex attributes carry
+# the block's rotation and its sticker colors to the instances, which are never
+# realized, a turn only rewrites these arrays (see RubikCube._write_nodes). Needs
+# Blender 3.2 or newer (Named Attribute node)
+class GeometryNodesCubeStrategy(InstancedCubeStrategy):
+	# Colors of the sticker code digits 1 to 6, 0 is no sticker
+	colors = ("Yellow", "Red", "Green", "Blue", "Orange", "White")
+
+	def __init__(self, radius = 0.25, resolution = 16, colors = None):
+		if bpy.app.version < (3, 2, 0):
+			raise RuntimeError("Geometry Nodes cubes need Blender 3.2 or newer")
+		super(GeometryNodesCubeStrategy, self).__init__(radius, resolution, colors)
+		# Block and node group are shared by the cubes with the same block detail and colors
+		self.nodes_name = "RubikCubeNodes_%d_%g" % (resolution, radius)
+		if self.color_dict != DEFAULT_COLORS:
+			self.nodes_name += "_" + palette_hash(self.color_dict)
+
+	# Sticker colors of a block packed in one number, the color (1 + index in colors) of
+	# the sticker facing face_slots[i] is digit i + 1 in base 8 (digit 0 is always 0)
+	def sticker_code(self, left = None, right = None, forward = None, back = None, top = None, bottom = None):
+		colors_dict = {
+			"left": left,
+			"right": right,
+			"forward": forward,
+			"back": back,
+			"top": top,
+			"bottom": bottom
+		}
 
-		for key in colors_dict:
+		code = 0
+		for i, key in enumerate(self.face_slots, 1):
 			if colors_dict[key] != None:
-				bpy.ops.object.material_slot_add()
-				bpy.data.objects[cube_name].active_material = self.material_dict["MaterialCube" + colors_dict[key]]
-				index_dict[key] = material_index
-				material_index += 1
+				code += (self.colors.index(colors_dict[key]) + 1) * 8 ** i
+		return code
+
+	# Material of the block's faces in slot (1 to 6, facing face_slots[slot - 1]). The
+	# instance's sticker code is read from the instancer, digit slot of it is the color
+	def sticker_material(self, slot):
+		name = "MaterialCubeSticker%d_%s" % (slot, palette_hash(self.color_dict))
+		material = bpy.data.materials.get(name)
+		if material is not None:
+			return material
+
+		material = bpy.data.materials.new(name)
+		material.use_nodes = True
+		clear_material(material)
+		nodes = material.node_tree.nodes
+		links = material.node_tree.links
+
+		def math(operation, value, second):
+			node = nodes.new('ShaderNodeMath')
+			node.operation = operation
+			links.new(value, node.inputs[0])
+			node.inputs[1].default_value = second
+			return node.outputs[0]
+
+		code = nodes.new('ShaderNodeAttribute')
+		code.attribute_type = 'INSTANCER'
+		code.attribute_name = "rubik_stickers"
+		digit = math('MODULO', math('FLOOR', math('DIVIDE', code.outputs["Fac"], 8 ** slot), 0), 8)
+
+		# Color slot 0 (no sticker) is the plastic, the ramp picks the color of a digit
+		ramp = nodes.new('ShaderNodeValToRGB')
+		ramp.color_ramp.interpolation = 'CONSTANT'
+		palette = ("Default",) + self.colors
+		elements = ramp.color_ramp.elements
+		elements[0].position = 0
+		elements[1].position = 1 / 8
+		for i in range(2, len(palette)):
+			elements.new(i / 8)
+		for element, key in zip(elements, palette):
+			element.color = self.color_dict[key]
+		links.new(math('DIVIDE', math('ADD', digit, 0.5), 8), ramp.inputs["Fac"])
+
+		diffuse = nodes.new('ShaderNodeBsdfDiffuse')
+		output = nodes.new('ShaderNodeOutputMaterial')
+		links.new(ramp.outputs["Color"], diffuse.inputs["Color"])
+		links.new(diffuse.outputs["BSDF"], output.inputs["Surface"])
+		return material
+
+	# Block object instanced by the node group, its faces keep the material slot of the
+	# direction they face (slots as in InstancedCubeStrategy)
+	def _block_object(self):
+		block = bpy.data.objects.get(self.nodes_name + "Block")
+		if block is None:
+			self._create_shared_mesh()
+			mesh = self.shared_mesh
+			mesh.name = self.nodes_name + "Block"
+			for slot in range(1, len(self.face_slots) + 1):
+				mesh.materials[slot] = self.sticker_material(slot)
+			block = bpy.data.objects.new(self.nodes_name + "Block", mesh)
+
+		return block
+
+	# Instances of the block on the cube's points. They aren't realized, the point
+	# attributes become instance attributes and the sticker materials read them
+	def node_group(self):
+		group = bpy.data.node_groups.get(self.nodes_name)
+		if group is not None:
+			return group
+
+		group = bpy.data.node_groups.new(self.nodes_name, 'GeometryNodeTree')
+		if hasattr(group, "interface"):
+			group.interface.new_socket("Geometry", in_out='INPUT', socket_type='NodeSocketGeometry')
+			group.interface.new_socket("Geometry", in_out='OUTPUT', socket_type='NodeSocketGeometry')
+		else:
+			group.inputs.new('NodeSocketGeometry', "Geometry")
+			group.outputs.new('NodeSocketGeometry', "Geometry")
+
+		nodes = group.nodes
+		links = group.links
+		group_input = nodes.new('NodeGroupInput')
+		group_output = nodes.new('NodeGroupOutput')
+		block = nodes.new('GeometryNodeObjectInfo')
+		block.inputs["Object"].default_value = self._block_object()
+		instance = nodes.new('GeometryNodeInstanceOnPoints')
+		rotation = nodes.new('GeometryNodeInputNamedAttribute')
+		rotation.data_type = 'FLOAT_VECTOR'
+		rotation.inputs["Name"].default_value = "rubik_rotation"
+
+		links.new(group_input.outputs[0], instance.inputs["Points"])
+		links.new(block.outputs["Geometry"], instance.inputs["Instance"])
+		# Older versions have an output per data type, only one is enabled
+		links.new(next(socket for socket in rotation.outputs if socket.enabled), instance.inputs["Rotation"])
+		links.new(instance.outputs["Instances"], group_output.inputs[0])
+
+		return group
+
+	# Object with a vertex per cubie at locations and the node group modifier
+	def new_cube_object(self, name, locations, codes):
+		mesh = bpy.data.meshes.new(name)
+		mesh.vertices.add(len(locations))
+		mesh.vertices.foreach_set("co", np.array(locations, dtype=np.float32).ravel())
+
+		mesh.attributes.new("rubik_rotation", 'FLOAT_VECTOR', 'POINT')
+		mesh.attributes.new("rubik_stickers", 'FLOAT', 'POINT')
+		mesh.attributes["rubik_stickers"].data.foreach_set("value", np.array(codes, dtype=np.float32))
+		mesh.update()
+
+		obj = bpy.data.objects.new(name, mesh)
+		modifier = obj.modifiers.new("RubikCubeNodes", 'NODES')
+		modifier.node_group = self.node_group()
+		obj["rubik_nodes"] = True
+		return obj
+
+
+EASINGS = {
+	'LINEAR': lambda t: t,
+	'EASE_IN': lambda t: t * t,
+	'EASE_OUT': lambda t: t * (2 - t),
+	'EASE_IN_OUT': lambda t: t * t * (3 - 2 * t)
+}
 
-		for face in bmesh.faces:
-			for key in index_dict:
-				if compare_vects(face.normal.normalized(), self.direction_dict[key], 0.2) == True:
-					face.select = True
-					bpy.context.object.active_material_index = index_dict[key]
-					bpy.ops.object.material_slot_assign()
-					face.select = False
 
-		bmesh.free()
-		bpy.ops.object.editmode_toggle()
+# Number of frames a turn by degrees takes
+def turn_steps(frames_per_turn, degrees):
+	return max(1, round(frames_per_turn * abs(degrees) / 90))
 
 
-class FancyCubeStrategy(PrimitiveCubeStrategy):
-	def __init__(self):
-		super(FancyCubeStrategy, self).__init__(1)
+# Samples turns of the cube's layers. Each sampled frame is a rotation about the cube's
+# pivot (in parent space) applied to the block's matrix_basis, so no operators, cursor
+# or pivot point settings are involved. RubikCube._update_keyframes writes the result
+class TurnAnimation:
+	def __init__(self, rubik_cube, frames_per_turn=None):
+		self.rubik_cube = rubik_cube
+		self.cubies = rubik_cube._get_cubies()
+		self.frames_per_turn = frames_per_turn if frames_per_turn else rubik_cube.frames_per_turn
+		self.easing = EASINGS[rubik_cube.easing]
+		self.frame = rubik_cube.cube_keyframe
 
-	def create(self, x, y, z):
-		cube_name = "CubeName"
-
-		bpy.context.scene.cursor.location = [x, y, z]
-		bpy.ops.mesh.primitive_cube_add(size=1)
-		cube = bpy.context.object
-		cube.name = cube_name
-
-		# Make rounded edges
-		bpy.ops.object.modifier_add(type='SUBSURF')
-		bpy.context.object.modifiers["Subdivision"].subdivision_type = 'SIMPLE'
-		bpy.context.object.modifiers["Subdivision"].render_levels = 4
-		bpy.context.object.modifiers["Subdivision"].levels = 4
-		bpy.ops.object.modifier_apply(apply_as='DATA', modifier="Subdivision")
-		bpy.ops.object.shade_smooth()
-
-		# Helping object
-		bpy.ops.mesh.primitive_cube_add(size=self.size / 2)
-		cube_shrink = bpy.context.object
-		cube_shrink.name = "CubeShrink0"
+		self.to_pivot = Matrix.Translation(rubik_cube.pivot_local)
+		self.from_pivot = Matrix.Translation(-rubik_cube.pivot_local)
 
-		bpy.context.view_layer.objects.active = cube
-		bpy.ops.object.modifier_add(type='SHRINKWRAP')
-		bpy.context.object.modifiers["Shrinkwrap"].target = bpy.data.objects["CubeShrink0"]
-		bpy.context.object.modifiers["Shrinkwrap"].offset = 0.25
-		bpy.ops.object.modifier_apply(apply_as='DATA', modifier="Shrinkwrap")
+		# cubie -> current matrix, current rotation and list of (frame, location, rotation)
+		self.matrices = {}
+		self.eulers = {}
+		self.keys = {}
 
-		bpy.context.view_layer.objects.active = cube_shrink
-		bpy.ops.object.delete()
+		# Blocks are read at the cube's last keyframe, evaluating the scene is only
+		# needed when the timeline is somewhere else
+		if bpy.context.scene.frame_current != self.frame:
+			bpy.context.scene.frame_set(self.frame)
 
-		bpy.context.view_layer.objects.active = cube
+	def _add_key(self, cubie, frame, matrix, euler):
+		cubie_keys = self.keys.setdefault(cubie, [])
+		if cubie_keys and cubie_keys[-1][0] == frame:
+			cubie_keys[-1] = (frame, matrix.to_translation(), euler)
+		else:
+			cubie_keys.append((frame, matrix.to_translation(), euler))
+
+	def _track(self, cubie):
+		if cubie not in self.matrices:
+			obj = self.cubies[cubie]
+			self.matrices[cubie] = obj.matrix_basis.copy()
+			self.eulers[cubie] = obj.rotation_euler.copy()
+
+	# Turn blocks by degrees (positive is clockwise like in CubieState) about the axis,
+	# snap puts them exactly on the grid at the end
+	def add_turn(self, moving, axis, degrees, snap=True, steps=None):
+		if steps is None:
+			steps = turn_steps(self.frames_per_turn, degrees)
+		rotations = [self.to_pivot @ Matrix.Rotation(-radians(degrees) * self.easing(k / steps), 4, axis) @ self.from_pivot
+					 for k in range(1, steps + 1)]
+
+		held = moving if self.rubik_cube.sparse_keyframes else self.cubies.keys()
+		for cubie in held:
+			# Hold key, so the block doesn't move before its turn
+			self._track(cubie)
+			self._add_key(cubie, self.frame, self.matrices[cubie], self.eulers[cubie])
+
+		for cubie in moving:
+			start = self.matrices[cubie]
+			euler = self.eulers[cubie]
+
+			for k, rotation in enumerate(rotations, 1):
+				matrix = rotation @ start
+				if snap and k == steps:
+					matrix = snap_matrix(matrix)
+				euler = matrix.to_euler('XYZ', euler)
+				self._add_key(cubie, self.frame + k, matrix, euler)
+
+			self.matrices[cubie] = matrix
+			self.eulers[cubie] = euler
+
+		self.frame += steps
+
+		if not self.rubik_cube.sparse_keyframes:
+			moving = set(moving)
+			for cubie in self.cubies:
+				if cubie not in moving:
+					self._add_key(cubie, self.frame, self.matrices[cubie], self.eulers[cubie])
+
+
+BLOCK_STRATEGIES = {
+	'FANCY': FancyCubeStrategy,
+	'PRIMITIVE': PrimitiveCubeStrategy,
+	'INSTANCED': InstancedCubeStrategy,
+	'NODES': GeometryNodesCubeStrategy
+}
 
 
 #########################################################
 
 
 class RubikCube:
-	def __init__(self, size, name="RubikCube"):
+	def __init__(self, size, name="RubikCube", cube_block_builder=None, fast=False, hollow=False, sparse_keyframes=True):
 		self.size = size
+		self.sparse_keyframes = sparse_keyframes
 		bpy.ops.object.empty_add(type='PLAIN_AXES')
 
-		self.parent_object = bpy.context.object
-		self.parent_object.name = name
+		self._parent_object = bpy.context.object
+		self._parent_object.name = name
 		# In case the name exists it may become sth like RubikCube.001
-		self.parent_object_name = self.parent_object.name
-
-		self.cube_block_builder = FancyCubeStrategy()
-		self._build_cube()
+		self.parent_object_name = self._parent_object.name
+
+		# Registry of the blocks: cubie index -> object, see _get_cubies
+		self._cubies = {}
+		# Object of a Geometry Nodes cube, see _nodes_object
+		self._nodes = None
+
+		self.cube_block_builder = cube_block_builder if cube_block_builder else FancyCubeStrategy()
+
+		# Center of the blocks grid in parent's space and its cached world position
+		self.pivot_local = Vector([(size + 1) / 2] * 3)
+		self._pivot_parent_matrix = None
+		self._pivot_world = None
+
+		if isinstance(self.cube_block_builder, GeometryNodesCubeStrategy):
+			self._build_cube_nodes()
+		elif fast:
+			builder = self.cube_block_builder
+			if not isinstance(builder, InstancedCubeStrategy):
+				# The same blocks and colors as the chosen strategy, only sharing one mesh
+				if isinstance(builder, FancyCubeStrategy):
+					self.cube_block_builder = InstancedCubeStrategy(builder.radius, builder.resolution,
+																	builder.color_dict)
+				else:
+					self.cube_block_builder = InstancedCubeStrategy.plain(builder.size, builder.color_dict)
+			self._build_cube_fast()
+		else:
+			self._build_cube(hollow)
 		self.cube_keyframe = 1
 
+		# Animation of a turn: frames per 90 degrees and one of EASINGS
+		self.frames_per_turn = 9
+		self.easing = 'LINEAR'
+
 		self.temp_angle = 0
+		self.temp_layer = None
 
-	def _build_cube(self):
+		# 'KEYFRAMES' keys the blocks, 'PIVOT' keys one pivot empty per turn (see _pivot_turn)
+		self.animation_mode = 'KEYFRAMES'
+		self.pivot_turns = []
+
+		# Turns of a Geometry Nodes cube as [start frame, steps, axis, degrees, easing, cubies],
+		# None for cubes made of block objects (see _write_nodes)
+		self.node_turns = [] if isinstance(self.cube_block_builder, GeometryNodesCubeStrategy) else None
+
+		# Complete moves as (axis, layers, turns), see solution
+		self.move_history = []
+		self._save_state()
+
+		# Registered so find_rubik_cube and the handlers use this cube and don't make
+		# another one from the parent's saved state
+		all_rubik_cubes[self.parent_object_name] = self
+
+	# Cube for a parent empty with the state saved by _save_state, e.g. after undo or
+	# loading a file. Nothing is built and the blocks' transforms aren't read
+	@classmethod
+	def from_parent_object(cls, parent_object):
+		rubik_cube = cls.__new__(cls)
+		size = parent_object["rubik_size"]
+		rubik_cube.size = size
+		rubik_cube._parent_object = parent_object
+		rubik_cube.parent_object_name = parent_object.name
+		rubik_cube.cube_block_builder = None
+
+		rubik_cube.pivot_local = Vector([(size + 1) / 2] * 3)
+		rubik_cube._pivot_parent_matrix = None
+		rubik_cube._pivot_world = None
+
+		# Blocks are found by their rubik_index property
+		rubik_cube._cubies = None
+		rubik_cube._nodes = None
+		rubik_cube.cubie_indices = {}
+		rubik_cube.cubie_names = [None] * size ** 3
+		for cubie, obj in rubik_cube._get_cubies().items():
+			rubik_cube.cubie_names[cubie] = obj.name
+			rubik_cube.cubie_indices[obj.name] = cubie
+		if "rubik_node_turns" in parent_object:
+			rubik_cube._name_node_cubies([cubie for cubie, position in enumerate(parent_object["rubik_positions"])
+										  if position != -1])
+
+		rubik_cube.locations_list = [Vector((x + 1, y + 1, z + 1)).freeze()
+									 for z in range(size) for y in range(size) for x in range(size)]
+		rubik_cube._load_state()
+		return rubik_cube
+
+	# Logical state kept in custom properties of the parent empty, so it's saved in
+	# the .blend and undo restores it together with the blocks
+	def _save_state(self):
+		parent_object = self.parent_object
+		parent_object["rubik_size"] = self.size
+		parent_object["rubik_positions"] = list(self.state.positions)
+		parent_object["rubik_orientations"] = list(self.state.orientations)
+		parent_object["rubik_history"] = format_moves(self.move_history, self.size)
+		parent_object["rubik_keyframe"] = self.cube_keyframe
+		# Angle, axis and layer of a turn left between the grid, -1 when there is none
+		if self.temp_layer:
+			parent_object["rubik_partial_turn"] = [self.temp_angle, AXES.index(self.temp_layer[0]), self.temp_layer[1]]
+		else:
+			parent_object["rubik_partial_turn"] = [0, -1, -1]
+		parent_object["rubik_pivot_turns"] = json.dumps(self.pivot_turns)
+		if self.node_turns is not None:
+			parent_object["rubik_node_turns"] = json.dumps(self.node_turns)
+		parent_object["rubik_sparse_keyframes"] = self.sparse_keyframes
+		parent_object["rubik_frames_per_turn"] = self.frames_per_turn
+		parent_object["rubik_easing"] = self.easing
+		parent_object["rubik_animation_mode"] = self.animation_mode
+
+	def _load_state(self):
+		parent_object = self.parent_object
+		self.state = CubieState(self.size, ())
+		self.state.positions = array('i', parent_object["rubik_positions"])
+		self.state.orientations = array('B', parent_object["rubik_orientations"])
+		self.state.grid = array('i', [-1]) * self.size ** 3
+		for cubie, position in enumerate(self.state.positions):
+			if position != -1:
+				self.state.grid[position] = cubie
+		self.state._index_layers()
+
+		self.locations_dict = {self.state.coords(cubie): name for cubie, name in enumerate(self.cubie_names)
+							   if name is not None and self.state.positions[cubie] != -1}
+		self.move_history = parse_moves(parent_object["rubik_history"], self.size)
+		self.cube_keyframe = parent_object["rubik_keyframe"]
+
+		temp_angle, axis_index, layer = parent_object["rubik_partial_turn"]
+		self.temp_angle = temp_angle
+		self.temp_layer = (AXES[axis_index], layer) if axis_index != -1 else None
+		self.pivot_turns = [tuple(turn) for turn in json.loads(parent_object["rubik_pivot_turns"])]
+		self.node_turns = json.loads(parent_object["rubik_node_turns"]) if "rubik_node_turns" in parent_object else None
+
+		# Files saved before these were kept have the defaults of __init__
+		self.sparse_keyframes = bool(parent_object.get("rubik_sparse_keyframes", True))
+		self.frames_per_turn = parent_object.get("rubik_frames_per_turn", 9)
+		self.easing = parent_object.get("rubik_easing", 'LINEAR')
+		self.animation_mode = parent_object.get("rubik_animation_mode", 'KEYFRAMES')
+
+	@property
+	def parent_object(self):
+		if self._parent_object is None:
+			self._parent_object = bpy.data.objects[self.parent_object_name]
+		return self._parent_object
+
+	# Stored object references become invalid after undo or file load, the handlers
+	# call this and the next access finds the objects again
+	def invalidate(self):
+		self._parent_object = None
+		self._cubies = None
+		self._nodes = None
+
+	# Blocks by cubie index. Only after invalidate the parent's children are read again
+	def _get_cubies(self):
+		if self._cubies is None:
+			self._cubies = {}
+			for obj in self.parent_object.children:
+				cubie = obj.get("rubik_index", self.cubie_indices.get(obj.name))
+				if cubie is not None:
+					self._cubies[cubie] = obj
+
+		return self._cubies
+
+	def _build_cube(self, hollow=False):
 		iter = 0
 		cube_number = 0
 
@@ -225,6 +2064,10 @@ class RubikCube:
 		self.locations_list = []
 		self.locations_dict = {}
 
+		self.cubie_names = []
+		self.cubie_indices = {}
+		cubies = []
+
 		# remember original cubes position
 		xy_loc = {}
 		xz_loc = {}
@@ -246,12 +2089,25 @@ class RubikCube:
 				iter2 += 1
 				iter3 = 0
 				for x in range(self.size):
-					self.cube_block_builder.create(iter3 + 1, iter2, iter)
 					iter3 += 1
 
+					# Interior blocks are never seen, a hollow cube doesn't have them
+					if hollow and not is_surface(x, y, z, self.size):
+						self.locations_list.append(Vector((iter3, iter2, iter)).freeze())
+						self.cubie_names.append(None)
+						cube_number += 1
+						continue
+
+					self.cube_block_builder.create(iter3, iter2, iter)
+
 					cube = bpy.context.object
 					cube.parent = self.parent_object
 					cube.name = cube.parent.name + '.Cube' + str(cube_number)
+					cube["rubik_index"] = cube_number
+					self._cubies[cube_number] = cube
+					self.cubie_names.append(cube.name)
+					self.cubie_indices[cube.name] = cube_number
+					cubies.append(cube_number)
 					cube_number += 1
 
 					xy_planes[z].append(cube.name)
@@ -262,52 +2118,18 @@ class RubikCube:
 					loc.freeze()
 
 					self.locations_list.append(loc)
-					self.locations_dict[loc] = cube.name
+					self.locations_dict[(x, y, z)] = cube.name
 
 					xy_loc[z][loc] = cube.name
 					xz_loc[y][loc] = cube.name
 					yz_loc[x][loc] = cube.name
 
-		bpy.context.scene.cursor.location = self.parent_object.location
+					colors = sticker_colors(x, y, z, self.size)
+					if colors:
+						self.cube_block_builder.color(cube, **colors)
 
-		# 1 color cubes
-		for i in range(self.size, self.size * self.size - self.size):
-			if not (i % self.size == 0 or i % self.size == self.size - 1):
-				self.cube_block_builder.color(xy_planes[self.size - 1][i], top = "Yellow")
-				self.cube_block_builder.color(xy_planes[0][i], bottom = "White")
-				self.cube_block_builder.color(xz_planes[self.size - 1][i], forward = "Blue")
-				self.cube_block_builder.color(xz_planes[0][i], back = "Green")
-				self.cube_block_builder.color(yz_planes[0][i], left = "Red")
-				self.cube_block_builder.color(yz_planes[self.size - 1][i], right = "Orange")
-
-		# 2 colors cubes
-		for i in range(1, self.size - 1):
-			# x axis
-			self.cube_block_builder.color(xy_planes[self.size - 1][i], back = "Green", top = "Yellow")
-			self.cube_block_builder.color(xy_planes[self.size - 1][self.size * self.size - self.size + i], forward = "Blue", top = "Yellow")
-			self.cube_block_builder.color(xy_planes[0][i], back = "Green" , bottom = "White")
-			self.cube_block_builder.color(xy_planes[0][self.size * self.size - self.size + i], forward = "Blue", bottom = "White")
-			# y axis
-			self.cube_block_builder.color(xy_planes[self.size - 1][i * self.size], left = "Red", top = "Yellow")
-			self.cube_block_builder.color(xy_planes[self.size - 1][self.size - 1 + i * self.size], right = "Orange", top = "Yellow")
-			self.cube_block_builder.color(xy_planes[0][i * self.size], left = "Red", bottom = "White")
-			self.cube_block_builder.color(xy_planes[0][self.size - 1 + i * self.size], right = "Orange", bottom = "White")
-			# z axis
-			self.cube_block_builder.color(xy_planes[i][0], left = "Red", back = "Green")
-			self.cube_block_builder.color(xy_planes[i][self.size - 1], back = "Green", right = "Orange")
-			self.cube_block_builder.color(xy_planes[i][self.size * self.size - 1], forward = "Blue", right = "Orange")
-			self.cube_block_builder.color(xy_planes[i][self.size * self.size - self.size], left = "Red", forward = "Blue")
-
-		# 3 colors cubes
-		self.cube_block_builder.color(xy_planes[self.size - 1][0], left = "Red", back = "Green", top = "Yellow")
-		self.cube_block_builder.color(xy_planes[self.size - 1][self.size - 1], right = "Orange", back = "Green", top = "Yellow")
-		self.cube_block_builder.color(xy_planes[self.size - 1][self.size * self.size - self.size], left = "Red", forward = "Blue", top = "Yellow")
-		self.cube_block_builder.color(xy_planes[self.size - 1][self.size * self.size - 1], right = "Orange", forward = "Blue", top = "Yellow")
-
-		self.cube_block_builder.color(xy_planes[0][0], left = "Red", back = "Green", bottom = "White")
-		self.cube_block_builder.color(xy_planes[0][self.size - 1], right = "Orange", back = "Green", bottom = "White")
-		self.cube_block_builder.color(xy_planes[0][self.size * self.size - self.size], left = "Red", forward = "Blue", bottom = "White")
-		self.cube_block_builder.color(xy_planes[0][self.size * self.size - 1], right = "Orange", forward = "Blue", bottom = "White")
+		bpy.context.scene.cursor.location = self.parent_object.location
+		self.state = CubieState(self.size, cubies if hollow else None)
 
 		self.xy_planes = xy_planes
 		self.xz_planes = xz_planes
@@ -317,150 +2139,580 @@ class RubikCube:
 		self.xz_loc = xz_loc
 		self.yz_loc = yz_loc
 
+	# Build only the cubies on the surface. Objects are created through bpy.data and linked
+	# to a collection that joins the scene at the end, so the cost is linear in cubie count
+	def _build_cube_fast(self):
+		n = self.size
+		parent_object = self.parent_object
+		collection = bpy.data.collections.new(self.parent_object_name)
+		# remove() deletes this collection only, it may be renamed like RubikCube.001
+		parent_object["rubik_collection"] = collection.name
+
+		self.xy_planes = [[] for i in range(n)]
+		self.xz_planes = [[] for i in range(n)]
+		self.yz_planes = [[] for i in range(n)]
+		self.xy_loc = {i: {} for i in range(n)}
+		self.xz_loc = {i: {} for i in range(n)}
+		self.yz_loc = {i: {} for i in range(n)}
+
+		self.locations_list = []
+		self.locations_dict = {}
+		self.cubie_names = [None] * n ** 3
+		self.cubie_indices = {}
+		surface = []
+
+		for z in range(n):
+			for y in range(n):
+				for x in range(n):
+					loc = Vector((x + 1, y + 1, z + 1))
+					loc.freeze()
+					self.locations_list.append(loc)
+
+					if not is_surface(x, y, z, n):
+						continue
+
+					cube_number = x + (y + z * n) * n
+					cube = self.cube_block_builder.new_object(self.parent_object_name + '.Cube' + str(cube_number), loc)
+					cube.parent = parent_object
+					cube["rubik_index"] = cube_number
+					self._cubies[cube_number] = cube
+					collection.objects.link(cube)
+					self.cube_block_builder.color(cube, **sticker_colors(x, y, z, n))
+
+					surface.append(cube_number)
+					self.cubie_names[cube_number] = cube.name
+					self.cubie_indices[cube.name] = cube_number
+
+					self.xy_planes[z].append(cube.name)
+					self.xz_planes[y].append(cube.name)
+					self.yz_planes[x].append(cube.name)
+
+					self.locations_dict[(x, y, z)] = cube.name
+					self.xy_loc[z][loc] = cube.name
+					self.xz_loc[y][loc] = cube.name
+					self.yz_loc[x][loc] = cube.name
+
+		bpy.context.scene.collection.children.link(collection)
+		bpy.context.scene.cursor.location = parent_object.location
+		self.state = CubieState(n, surface)
+
+	# Names of a Geometry Nodes cube's cubies, there are no objects with these names but
+	# rotate and locations_dict work with names like for the other cubes
+	def _name_node_cubies(self, cubies):
+		self.cubie_names = [None] * self.size ** 3
+		self.cubie_indices = {}
+		for cubie in cubies:
+			name = self.parent_object_name + '.Cube' + str(cubie)
+			self.cubie_names[cubie] = name
+			self.cubie_indices[name] = cubie
+
+	# Build the cube as one object, a vertex for each cubie on the surface (in cubie order)
+	def _build_cube_nodes(self):
+		n = self.size
+		parent_object = self.parent_object
+
+		self.locations_list = [Vector((x + 1, y + 1, z + 1)).freeze() for z in range(n) for y in range(n) for x in range(n)]
+		surface = [cubie for cubie, loc in enumerate(self.locations_list) if is_surface(loc.x - 1, loc.y - 1, loc.z - 1, n)]
+		self._name_node_cubies(surface)
+		self.state = CubieState(n, surface)
+		self.locations_dict = {self.state.coords(cubie): self.cubie_names[cubie] for cubie in surface}
+
+		codes = [self.cube_block_builder.sticker_code(**sticker_colors(*self.state.coords(cubie), n)) for cubie in surface]
+		obj = self.cube_block_builder.new_cube_object(self.parent_object_name + '.Nodes',
+													  [self.locations_list[cubie] for cubie in surface], codes)
+		obj.parent = parent_object
+		for collection in parent_object.users_collection:
+			collection.objects.link(obj)
+		self._nodes = obj
+
+		bpy.context.scene.cursor.location = parent_object.location
+
+	# Like _get_cubies the parent's children are only read again after invalidate
+	def _nodes_object(self):
+		if self._nodes is None:
+			self._nodes = next((obj for obj in self.parent_object.children if obj.get("rubik_nodes")), None)
+		return self._nodes
+
+	# Record a turn of a Geometry Nodes cube, _write_nodes plays it back
+	def _node_turn(self, moving, axis, degrees, steps=None):
+		if steps is None:
+			steps = turn_steps(self.frames_per_turn, degrees)
+
+		self.node_turns.append([self.cube_keyframe, steps, axis, degrees, self.easing, sorted(moving)])
+		self.cube_keyframe += steps
+		bpy.context.scene.frame_current = self.cube_keyframe
+
+	# Write the cubies' locations and rotations at the frame to the points of the Geometry
+	# Nodes cube. The state is the one after the last turn, turns that aren't finished at
+	# the frame are undone from the newest by the part of the turn that is still left
+	def _write_nodes(self, frame):
+		obj = self._nodes_object()
+		if obj is None:
+			return
+
+		n = self.size
+		positions = np.array(self.state.positions)
+		surface = np.flatnonzero(positions != -1)
+		vertices = np.full(n ** 3, -1)
+		vertices[surface] = np.arange(len(surface))
+
+		positions = positions[surface]
+		offset = (n - 1) / 2
+		locations = np.stack([positions % n, positions // n % n, positions // (n * n)], axis=1) - offset
+		rotations = np.array(ROTATIONS, dtype=float)[np.array(self.state.orientations)[surface]]
+
+		for start, steps, axis, degrees, easing, moving in reversed(self.node_turns):
+			if start + steps <= frame:
+				break
+
+			done = EASINGS[easing](min(max((frame - start) / steps, 0), 1))
+			turn = np.array(Matrix.Rotation(-radians(degrees) * (done - 1), 3, axis))
+
+			indices = vertices[moving]
+			locations[indices] = locations[indices] @ turn.T
+			rotations[indices] = turn @ rotations[indices]
+
+		# Euler XYZ of the rotation matrices, like Matrix.to_euler('XYZ')
+		cy = np.hypot(rotations[:, 0, 0], rotations[:, 1, 0])
+		gimbal = cy < 1e-6
+		eulers = np.empty((len(surface), 3))
+		eulers[:, 0] = np.where(gimbal, np.arctan2(-rotations[:, 1, 2], rotations[:, 1, 1]),
+								np.arctan2(rotations[:, 2, 1], rotations[:, 2, 2]))
+		eulers[:, 1] = np.arctan2(-rotations[:, 2, 0], cy)
+		eulers[:, 2] = np.where(gimbal, 0, np.arctan2(rotations[:, 1, 0], rotations[:, 0, 0]))
+
+		mesh = obj.data
+		mesh.vertices.foreach_set("co", (locations + offset + 1).astype(np.float32).ravel())
+		mesh.attributes["rubik_rotation"].data.foreach_set("vector", eulers.astype(np.float32).ravel())
+		mesh.update()
+
+	# Turns don't move the centroid of the cube, so the pivot is kept in the parent's
+	# space and moved to world space again only when the parent transform changes
 	def _find_center_point(self):
-		x_sum = 0
-		y_sum = 0
-		z_sum = 0
-		for plane in self.xy_planes:
-			for cube_name in plane:
-				x_sum += bpy.data.objects[cube_name].matrix_world.translation.x
-				y_sum += bpy.data.objects[cube_name].matrix_world.translation.y
-				z_sum += bpy.data.objects[cube_name].matrix_world.translation.z
-
-		num = self.size * len(self.xy_planes[0])
-		return [x_sum / num, y_sum / num, z_sum / num]
-
-	def _select_all_elements(self):
-		for obj in get_children(bpy.data.objects[self.parent_object_name]):
-			obj.select_set(True)
-
-	def _update_keyframes(self):
-		self._select_all_elements()
-		bpy.context.scene.frame_set(self.cube_keyframe)
-		bpy.ops.anim.keyframe_insert(type='LocRotScale')
-		bpy.ops.object.select_all(action='DESELECT')
+		parent_matrix = self.parent_object.matrix_world
+
+		if self._pivot_parent_matrix != parent_matrix:
+			self._pivot_parent_matrix = parent_matrix.copy()
+			self._pivot_world = parent_matrix @ self.pivot_local
+
+		return list(self._pivot_world)
 
-	# Rotate face that contains miniature cube (of cube_name) around the axis
+	# Write the keys collected by the animation to the F-curves and leave the blocks
+	# in their final transforms
+	def _update_keyframes(self, animation):
+		for cubie, cubie_keys in animation.keys.items():
+			obj = animation.cubies[cubie]
+			action = get_action(obj)
+			frames = [key[0] for key in cubie_keys]
+
+			for i in range(3):
+				write_keyframes(action, "location", i, frames, [key[1][i] for key in cubie_keys])
+				write_keyframes(action, "rotation_euler", i, frames, [key[2][i] for key in cubie_keys])
+
+			obj.location = animation.matrices[cubie].to_translation()
+			obj.rotation_euler = animation.eulers[cubie]
+
+		# The blocks already have their final transforms, moving the timeline doesn't
+		# need the whole scene evaluated like frame_set does
+		self.cube_keyframe = animation.frame
+		bpy.context.scene.frame_current = self.cube_keyframe
+
+	# Rotate face that contains miniature cube (of cube_name) around the axis. Turns that
+	# are not a multiple of 90 degrees leave the layer in between (temp_angle), and only
+	# that layer can be turned until it's back on the grid
 	def rotate(self, cube_name, axis, degrees=90):
-		dict_items_to_change = {}
-		self._update_keyframes()
-		self.center_point = self._find_center_point()
-
-		if degrees % 90 == 0:
-			parent_object = bpy.data.objects[self.parent_object_name]
-
-			self.center_point = self._find_center_point()
-			origin = Vector(self.center_point)
-			# Prepare cursor for rotating around center point
-			bpy.context.scene.cursor.rotation_euler = parent_object.rotation_euler
-			prev_tool_setting = bpy.context.scene.tool_settings.transform_pivot_point
-			bpy.context.scene.cursor.location = origin
-
-			bpy.context.scene.tool_settings.transform_pivot_point = 'CURSOR'
-			current_frame = bpy.context.scene.frame_current
-			anim_iters = int(degrees / 10)
-
-			if axis == 'X':
-				index = self.locations_list.index(bpy.data.objects[cube_name].location)
-				start_index = index % self.size
-
-				for i in range(self.size ** 2):
-					loc = self.locations_list[start_index + i * self.size]
-					name = self.locations_dict[loc]
-					bpy.ops.object.select_all(action='DESELECT')
-					obj = bpy.data.objects[name]
-					obj.select_set(True)
-
-					# Rotate step by step for animation
-					for k in range(anim_iters):
-						bpy.context.scene.frame_set(current_frame + k)
-						bpy.ops.transform.rotate(value=math.radians(10), orient_axis='X', orient_type='CURSOR')
-						bpy.ops.anim.keyframe_insert(type='LocRotScale')
-
-					# rotate help object
-					obj.location = round_vect(obj.location, 3)
-					new_loc = obj.location.copy()
-					bpy.ops.anim.keyframe_insert(type='LocRotScale')
-
-					new_loc.freeze()
-					dict_items_to_change[new_loc] = name
-
-			if axis == 'Y':
-				index = self.locations_list.index(bpy.data.objects[cube_name].location)
-				temp = index % (self.size ** 2)
-				start_index = int(temp / self.size) * self.size
-
-				for i in range(self.size):
-					for j in range(self.size):
-						loc = self.locations_list[start_index + i * self.size ** 2 + j]
-						name = self.locations_dict[loc]
-						bpy.ops.object.select_all(action='DESELECT')
-						obj = bpy.data.objects[name]
-						obj.select_set(True)
-
-						# Rotate step by step for animation
-						for k in range(anim_iters):
-							bpy.context.scene.frame_set(current_frame + k)
-							bpy.ops.transform.rotate(value=math.radians(10), orient_axis='Y', orient_type='CURSOR')
-							bpy.ops.anim.keyframe_insert(type='LocRotScale')
-
-						obj.location = round_vect(obj.location, 3)
-						new_loc = obj.location.copy()
-						bpy.ops.anim.keyframe_insert(type='LocRotScale')
-
-						new_loc.freeze()
-						dict_items_to_change[new_loc] = name
-
-			if axis == 'Z':
-				index = self.locations_list.index(bpy.data.objects[cube_name].location)
-				start_index = int(index / self.size ** 2) * self.size ** 2
-
-				for i in range(self.size ** 2):
-					loc = self.locations_list[start_index + i]
-					name = self.locations_dict[loc]
-					bpy.ops.object.select_all(action='DESELECT')
-					obj = bpy.data.objects[name]
-					obj.select_set(True)
-
-					# Rotate step by step for animation
-					for k in range(anim_iters):
-						bpy.context.scene.frame_set(current_frame + k)
-						bpy.ops.transform.rotate(value=math.radians(10), orient_axis='Z', orient_type='CURSOR')
-						bpy.ops.anim.keyframe_insert(type='LocRotScale')
-
-					obj.location = round_vect(obj.location, 3)
-					new_loc = obj.location.copy()
-					bpy.ops.anim.keyframe_insert(type='LocRotScale')
-
-					new_loc.freeze()
-					dict_items_to_change[new_loc] = name
+		cubie = self.cubie_indices[cube_name]
+		layer = self.state.layer_of(cubie, axis)
+
+		if self.temp_angle and self.temp_layer != (axis, layer):
+			raise ValueError("Finish turning the layer rotated by " + str(self.temp_angle) + " degrees first")
+
+		total = self.temp_angle + degrees
+		complete = total % 90 == 0
+		moving = list(self.state.layer_cubies(axis, layer))
+
+		if self.node_turns is not None:
+			if not complete:
+				raise ValueError("Geometry Nodes cubes turn only by multiples of 90 degrees")
+			self._node_turn(moving, axis, degrees)
+		elif self.animation_mode == 'PIVOT':
+			self._pivot_turn(moving, axis, degrees, complete)
 		else:
-			# TODO: create a method to deal with this rotation
-			pass
-
-		self.cube_keyframe = current_frame + anim_iters
+			self.bake_pivots()
+			animation = TurnAnimation(self)
+			animation.add_turn(moving, axis, degrees, complete)
+			self._update_keyframes(animation)
+
+		if complete:
+			self.state.apply_move(axis, layer, total // 90)
+			# Turning back to where the layer started is no move
+			if total // 90 % 4:
+				self.move_history.append((axis, (layer,), total // 90))
+			self.temp_angle = 0
+			self.temp_layer = None
+
+			for layer_cubie in moving:
+				self.locations_dict[self.state.coords(layer_cubie)] = self.cubie_names[layer_cubie]
+		else:
+			self.temp_angle = total
+			self.temp_layer = (axis, layer)
+
+		if self.node_turns is not None:
+			self._write_nodes(self.cube_keyframe)
+		self._save_state()
+
+		cubies = self._get_cubies()
+		if cubie in cubies:
+			for obj in bpy.context.selected_objects:
+				obj.select_set(False)
+			cubies[cubie].select_set(True)
+
+	# Animate a whole move sequence like "R U R' U2". Transforms of all the cubies are
+	# computed first and then keyframes are written straight to the F-curves
+	def apply_sequence(self, sequence, frames_per_turn=None):
+		if self.temp_angle:
+			raise ValueError("Finish turning the layer rotated by " + str(self.temp_angle) + " degrees first")
+
+		moves = parse_moves(sequence, self.size)
+		frames_per_turn = frames_per_turn if frames_per_turn else self.frames_per_turn
+		pivot_mode = self.animation_mode == 'PIVOT'
+		keyed = not pivot_mode and self.node_turns is None
+		if keyed:
+			self.bake_pivots()
+			animation = TurnAnimation(self, frames_per_turn)
+		moved = set()
+
+		for axis, layers, turns in moves:
+			moving = []
+			for layer in layers:
+				moving.extend(self.state.layer_cubies(axis, layer))
+				self.state.apply_move(axis, layer, turns)
+
+			if self.node_turns is not None:
+				self._node_turn(moving, axis, turns * 90, turn_steps(frames_per_turn, turns * 90))
+			elif pivot_mode:
+				self._pivot_turn(moving, axis, turns * 90, True, turn_steps(frames_per_turn, turns * 90))
+			else:
+				animation.add_turn(moving, axis, turns * 90)
+			moved.update(moving)
+			self.move_history.append((axis, layers, turns))
+
+		if keyed:
+			self._update_keyframes(animation)
+
+		for cubie in moved:
+			self.locations_dict[self.state.coords(cubie)] = self.cubie_names[cubie]
+
+		if self.node_turns is not None:
+			self._write_nodes(self.cube_keyframe)
+		self._save_state()
+
+	# Moves in SiGN notation solving the cube. 2x2 and 3x3 are searched with the two-phase
+	# solver, bigger cubes up to REDUCTION_MAX_SIZE are reduced to a 3x3 first
+	def solution(self):
+		if self.size <= 3:
+			return solve_state(self.state)
+
+		return solve_reduction(self.state)
+
+	# Delete the cube's objects, its fast build collection and meshes nothing else uses
+	def remove(self):
+		self.bake_pivots()
+		meshes = set()
+		nodes_object = self._nodes_object()
+		for obj in list(self._get_cubies().values()) + ([nodes_object] if nodes_object else []):
+			if obj.data is not None:
+				meshes.add(obj.data)
+			bpy.data.objects.remove(obj)
+
+		collection = bpy.data.collections.get(self.parent_object.get("rubik_collection", ""))
+		if collection is not None:
+			bpy.data.collections.remove(collection)
+		bpy.data.objects.remove(self.parent_object)
+
+		for mesh in meshes:
+			if mesh.users == 0:
+				bpy.data.meshes.remove(mesh)
+
+		if all_rubik_cubes.get(self.parent_object_name) is self:
+			del all_rubik_cubes[self.parent_object_name]
+		self.invalidate()
+
+	# Compare the state read by update() with the recorded moves replayed on stickers,
+	# False if locations_dict or the state doesn't match them
+	def check_state(self):
+		for coords, name in self.locations_dict.items():
+			if self.state.coords(self.cubie_indices[name]) != coords:
+				return False
+
+		return CubeState.from_cubie_state(self.state) == CubeState(self.size).apply_moves(self.move_history)
+
+	# Turn blocks with a pivot empty: only the pivot is keyed, on one F-curve, and the
+	# blocks follow it through Child Of constraints until bake_pivots
+	def _pivot_turn(self, moving, axis, degrees, snap=True, steps=None):
+		parent_object = self.parent_object
+		if steps is None:
+			steps = turn_steps(self.frames_per_turn, degrees)
+
+		pivot = bpy.data.objects.new(self.parent_object_name + ".Pivot", None)
+		pivot.empty_display_size = 0.5
+		pivot.parent = parent_object
+		pivot.location = self.pivot_local
+		for collection in parent_object.users_collection:
+			collection.objects.link(pivot)
+
+		axis_index = AXES.index(axis)
+		easing = EASINGS[self.easing]
+		frames = [self.cube_keyframe + k for k in range(steps + 1)]
+		values = [-radians(degrees) * easing(k / steps) for k in range(steps + 1)]
+		write_keyframes(get_action(pivot), "rotation_euler", axis_index, frames, values)
+		pivot.rotation_euler[axis_index] = values[-1]
+
+		# Child Of applies pivot's matrix relative to its rest pose. Both are siblings
+		# under the parent, in local space the chain doesn't depend on where the parent is
+		inverse = Matrix.Translation(-self.pivot_local)
+		cubies = self._get_cubies()
+
+		for cubie in moving:
+			constraint = cubies[cubie].constraints.new('CHILD_OF')
+			constraint.name = pivot.name
+			constraint.target = pivot
+			constraint.owner_space = 'LOCAL'
+			constraint.target_space = 'LOCAL'
+			constraint.inverse_matrix = inverse
+
+		self.pivot_turns.append((pivot.name, list(moving), axis, degrees, snap, self.cube_keyframe, steps, self.easing))
+		self.cube_keyframe += steps
+		bpy.context.scene.frame_current = self.cube_keyframe
+
+	# Replace pivot empties and their constraints with keyframes on the blocks
+	def bake_pivots(self):
+		if not self.pivot_turns:
+			return
+
+		self._remove_pivot_constraints()
+		self.cube_keyframe = self.pivot_turns[0][5]
+		animation = TurnAnimation(self)
+
+		for pivot_name, moving, axis, degrees, snap, frame, steps, easing in self.pivot_turns:
+			animation.frame = frame
+			animation.easing = EASINGS[easing]
+			animation.add_turn(moving, axis, degrees, snap, steps)
+
+			pivot = bpy.data.objects.get(pivot_name)
+			if pivot:
+				bpy.data.objects.remove(pivot)
+
+		self.pivot_turns = []
+		self._update_keyframes(animation)
+		self._save_state()
+
+	def _remove_pivot_constraints(self):
+		pivot_names = set(turn[0] for turn in self.pivot_turns)
+		for obj in self._get_cubies().values():
+			for constraint in list(obj.constraints):
+				if constraint.type == 'CHILD_OF' and constraint.name in pivot_names:
+					obj.constraints.remove(constraint)
+
+	# Put every block back where the build left it (locations_list) and drop all the
+	# animation, much cheaper than building the cube again for the next scramble
+	def reset(self):
+		self._remove_pivot_constraints()
+		for turn in self.pivot_turns:
+			pivot = bpy.data.objects.get(turn[0])
+			if pivot:
+				bpy.data.objects.remove(pivot)
+		self.pivot_turns = []
+
+		cubies = self._get_cubies()
+		actions = set()
+		for cubie, obj in cubies.items():
+			if obj.animation_data and obj.animation_data.action:
+				actions.add(obj.animation_data.action)
+			obj.animation_data_clear()
+			obj.location = self.locations_list[cubie]
+			obj.rotation_euler = (0, 0, 0)
+
+		for action in actions:
+			if action.users == 0:
+				bpy.data.actions.remove(action)
+
+		present = [cubie for cubie, position in enumerate(self.state.positions) if position != -1]
+		self.state = CubieState(self.size, None if len(present) == self.size ** 3 else present)
+		self.locations_dict = {self.state.coords(cubie): self.cubie_names[cubie] for cubie in present}
+		self.move_history = []
+		self.temp_angle = 0
+		self.temp_layer = None
+		self.cube_keyframe = 1
+		if self.node_turns is not None:
+			self.node_turns = []
+			self._write_nodes(self.cube_keyframe)
+		self._save_state()
 		bpy.context.scene.frame_set(self.cube_keyframe)
-		bpy.context.scene.cursor.location = parent_object.location
-		bpy.context.scene.tool_settings.transform_pivot_point = prev_tool_setting
 
-		self._select_all_elements()
-		bpy.data.objects[self.parent_object_name].select_set(False)
-		bpy.ops.anim.keyframe_insert(type='BUILTIN_KSI_LocRot')
+	# Read the state back from the objects, locations and rotations are rounded to
+	# the grid so float drift doesn't matter. locations_dict maps (x, y, z) to name
+	def update(self):
+		if self.temp_angle or self.pivot_turns or self.node_turns is not None:
+			# The turning layer is off the grid, the blocks are moved by pivot constraints
+			# and not by their own transforms or there are no block objects at all
+			return
 
-		bpy.ops.object.select_all(action='DESELECT')
-		bpy.data.objects[cube_name].select_set(True)
+		placements = []
 
-		for key in dict_items_to_change:
-			self.locations_dict[key] = dict_items_to_change[key]
+		for cubie, cube in self._get_cubies().items():
+			matrix = snap_matrix(cube.matrix_basis)
+			coords = tuple(int(value) - 1 for value in matrix.translation)
+			rotation = tuple(tuple(int(value) for value in row) for row in matrix.to_3x3())
 
-	def update(self):
-		obj = bpy.data.objects[self.parent_object_name]
-		cubies = get_children(obj)
+			if min(coords) < 0 or max(coords) >= self.size or rotation not in ROTATION_INDEX:
+				# Moved by hand off the grid, keep what we know about it
+				coords = self.state.coords(cubie)
+				orientation = self.state.orientations[cubie]
+			else:
+				orientation = ROTATION_INDEX[rotation]
 
-		for cube in cubies:
-			loc = cube.location.copy()
-			loc.freeze()
-			self.locations_dict[loc] = cube.name
+			placements.append((cubie, coords, orientation))
+
+		self.state = CubieState.from_placements(self.size, placements)
+		self.locations_dict = {coords: self.cubie_names[cubie] for cubie, coords, orientation in placements}
+		self._save_state()
+
+
+###############################################################
+# Instrumentation #############################################
+# Off by default. enable() replaces the hot functions with timed wrappers and counts
+# operator calls and depsgraph updates, disable() puts the originals back, so the
+# addon runs exactly as without it when profiling is off. Times include nested phases
+class Profiler:
+	# Module functions and methods that are timed, strategy methods are added in _targets
+	FUNCTIONS = ('write_keyframes', 'assign_face_materials', 'solve_state')
+	METHODS = {
+		'RubikCube': ('_build_cube', '_build_cube_fast', 'rotate', 'apply_sequence', '_update_keyframes',
+					  '_pivot_turn', 'bake_pivots', 'update', 'reset', '_get_cubies', '_save_state'),
+		'TurnAnimation': ('add_turn',)
+	}
+
+	def __init__(self):
+		self.enabled = False
+		self._originals = []
+		self._operator_call = None
+		self.clear()
+
+	def clear(self):
+		# label -> [calls, seconds], operator idname -> [calls, seconds]
+		self.phases = {}
+		self.operators = {}
+		self.depsgraph_updates = 0
+		self.frame_changes = 0
+
+	# (owner, name, label) of everything timed, the owner of module functions is globals()
+	# so it works in the Text Editor too, where the script isn't in sys.modules
+	def _targets(self):
+		targets = [(globals(), name, name) for name in self.FUNCTIONS]
+		for class_name, names in self.METHODS.items():
+			targets += [(globals()[class_name], name, class_name + '.' + name) for name in names]
+
+		for strategy in (CubeBlockBuilder,) + tuple(BLOCK_STRATEGIES.values()):
+			for name in ('create', 'color', 'new_object', '_create_shared_mesh'):
+				# Only methods the class defines itself, inherited ones are wrapped in the base
+				if name in strategy.__dict__:
+					targets.append((strategy, name, strategy.__name__ + '.' + name))
+
+		return targets
+
+	def _timed(self, label, function, table):
+		@functools.wraps(function)
+		def timed(*args, **kwargs):
+			start = time.perf_counter()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				entry = table.setdefault(label, [0, 0.0])
+				entry[0] += 1
+				entry[1] += time.perf_counter() - start
+
+		return timed
+
+	def _replace(self, owner, name, function):
+		if isinstance(owner, dict):
+			owner[name] = function
+		else:
+			setattr(owner, name, function)
+
+	def _count_depsgraph_update(self, *args):
+		self.depsgraph_updates += 1
+
+	def _count_frame_change(self, *args):
+		self.frame_changes += 1
+
+	def enable(self):
+		if self.enabled:
+			return
+		self.enabled = True
+
+		for owner, name, label in self._targets():
+			original = owner[name] if isinstance(owner, dict) else getattr(owner, name)
+			self._originals.append((owner, name, original))
+			self._replace(owner, name, self._timed(label, original, self.phases))
+
+		# Every bpy.ops.module.operator is an instance of the same Python class
+		operator_class = type(bpy.ops.object.select_all)
+		self._operator_call = operator_class.__call__
+		original_call = self._operator_call
+		operators = self.operators
+
+		def counted_call(operator, *args, **kwargs):
+			start = time.perf_counter()
+			try:
+				return original_call(operator, *args, **kwargs)
+			finally:
+				entry = operators.setdefault(operator.idname_py(), [0, 0.0])
+				entry[0] += 1
+				entry[1] += time.perf_counter() - start
+
+		operator_class.__call__ = counted_call
+		bpy.app.handlers.depsgraph_update_post.append(self._count_depsgraph_update)
+		bpy.app.handlers.frame_change_post.append(self._count_frame_change)
+
+	def disable(self):
+		if not self.enabled:
+			return
+		self.enabled = False
+
+		for owner, name, original in reversed(self._originals):
+			self._replace(owner, name, original)
+		self._originals = []
+
+		type(bpy.ops.object.select_all).__call__ = self._operator_call
+		for handlers, handler in ((bpy.app.handlers.depsgraph_update_post, self._count_depsgraph_update),
+								  (bpy.app.handlers.frame_change_post, self._count_frame_change)):
+			if handler in handlers:
+				handlers.remove(handler)
+
+	def report(self):
+		return {
+			"phases": {label: {"calls": calls, "seconds": seconds} for label, (calls, seconds) in self.phases.items()},
+			"operators": {idname: {"calls": calls, "seconds": seconds}
+						  for idname, (calls, seconds) in self.operators.items()},
+			"depsgraph_updates": self.depsgraph_updates,
+			"frame_changes": self.frame_changes,
+			"objects": len(bpy.data.objects),
+			"meshes": len(bpy.data.meshes),
+			"materials": len(bpy.data.materials),
+			"actions": len(bpy.data.actions)
+		}
+
+	def dump(self, path):
+		with open(path, 'w') as file:
+			json.dump(self.report(), file, indent=1)
+
+
+profiler = Profiler()
+
+# Environment variable with a file path, e.g. RUBIK_ADDON_PROFILE=profile.json blender -b ...
+# profiles the whole background run and writes the report when Blender exits
+PROFILE_ENV_VARIABLE = "RUBIK_ADDON_PROFILE"
 
 
 # Usage example
@@ -473,6 +2725,7 @@ a.rotate('Cube18', 'X')
 
 
 from bpy.props import (StringProperty,
+					   BoolProperty,
 					   IntProperty,
 					   FloatProperty,
 					   FloatVectorProperty,
@@ -486,7 +2739,27 @@ from bpy.types import (Panel,
 
 
 # OPERATORS - Build ###########################################
-all_rubik_cubes = []
+# Cubes by parent object name. Emptied on undo and file load, the cubes are then
+# made again from the state saved on their parent empties
+all_rubik_cubes = {}
+
+
+# Cube the object (a block or the cube's parent) belongs to
+def find_rubik_cube(obj):
+	if obj is None:
+		return None
+
+	parent_object = obj.parent if obj.parent else obj
+	rubik_cube = all_rubik_cubes.get(parent_object.name)
+	if rubik_cube is None and "rubik_size" in parent_object:
+		rubik_cube = RubikCube.from_parent_object(parent_object)
+		all_rubik_cubes[parent_object.name] = rubik_cube
+
+	return rubik_cube
+
+
+# Bigger cubes are always built with RubikCube._build_cube_fast
+CLASSIC_BUILD_MAX_SIZE = 6
 
 class OperatorBuildProperties(bpy.types.PropertyGroup):
 	size: IntProperty(
@@ -494,7 +2767,37 @@ class OperatorBuildProperties(bpy.types.PropertyGroup):
 		description="Rubik's cube size",
 		default=3,
 		min=2,
-		max=6
+		max=20
+	)
+
+	fast: BoolProperty(
+		name="Fast Build",
+		description="Build only the visible blocks sharing one mesh (always used above 6x6)",
+		default=False
+	)
+
+	hollow: BoolProperty(
+		name="Hollow",
+		description="Skip the interior blocks, which are never seen",
+		default=False
+	)
+
+	resolution: IntProperty(
+		name="Block Detail",
+		description="Quads along a rounded block's edge, lower is lighter for big cubes",
+		default=16,
+		min=2,
+		max=32
+	)
+
+	strategy: EnumProperty(
+		name="Blocks",
+		description="How the cube's blocks are built",
+		items=[("FANCY", "Fancy", "Rounded blocks, each with its own mesh"),
+			   ("INSTANCED", "Instanced", "Rounded blocks sharing one mesh, colored per object"),
+			   ("PRIMITIVE", "Primitive", "Plain cubes"),
+			   ("NODES", "Geometry Nodes", "One object instancing the block with Geometry Nodes, turned by sequences (Blender 3.2+)")
+			   ]
 	)
 
 
@@ -504,11 +2807,19 @@ class RC_OT_Build(Operator):
 	bl_options = {'REGISTER', 'UNDO'}
 
 	def execute(self, context):
-		global all_rubik_cubes
-
 		size = context.scene.cube_build_props.size
-		rubik_cube = RubikCube(size, "RubikCube" + str(len(all_rubik_cubes)))
-		all_rubik_cubes.append(rubik_cube)
+		strategy = BLOCK_STRATEGIES[context.scene.cube_build_props.strategy]
+		try:
+			if issubclass(strategy, FancyCubeStrategy):
+				cube_block_builder = strategy(resolution=context.scene.cube_build_props.resolution)
+			else:
+				cube_block_builder = strategy()
+		except RuntimeError as error:
+			self.report({'ERROR'}, str(error))
+			return {'CANCELLED'}
+		fast = context.scene.cube_build_props.fast or size > CLASSIC_BUILD_MAX_SIZE
+		hollow = context.scene.cube_build_props.hollow
+		RubikCube(size, "RubikCube" + str(len(all_rubik_cubes)), cube_block_builder, fast, hollow)
 
 		bpy.ops.wm.tool_set_by_id(name='builtin.select_box', space_type='VIEW_3D')
 
@@ -516,6 +2827,12 @@ class RC_OT_Build(Operator):
 
 
 # OPERATORS - Rotate ###########################################
+ROTATE_AXIS_ITEMS = [("X", "X", "OP1"),
+					 ("Y", "Y", "OP2"),
+					 ("Z", "Z", "OP3")
+					 ]
+
+
 class OperatorRotateProperties(bpy.types.PropertyGroup):
 	angle: IntProperty(
 		name="Angle",
@@ -528,9 +2845,38 @@ class OperatorRotateProperties(bpy.types.PropertyGroup):
 	axis_enum: EnumProperty(
 		name="Axis",
 		description="Axis to rotate selected cube's part",
-		items=[("X", "X", "OP1"),
-			   ("Y", "Y", "OP2"),
-			   ("Z", "Z", "OP3")
+		items=ROTATE_AXIS_ITEMS
+	)
+
+	sequence: StringProperty(
+		name="Sequence",
+		description="Moves to apply, e.g. R U R' U2",
+		default=""
+	)
+
+	frames: IntProperty(
+		name="Frames",
+		description="Animation length of a 90 degrees turn",
+		default=9,
+		min=1,
+		max=240
+	)
+
+	easing: EnumProperty(
+		name="Easing",
+		description="Speed of the turn over time",
+		items=[("LINEAR", "Linear", "Constant speed"),
+			   ("EASE_IN_OUT", "Ease In and Out", "Speed up and slow down"),
+			   ("EASE_IN", "Ease In", "Speed up"),
+			   ("EASE_OUT", "Ease Out", "Slow down")
+			   ]
+	)
+
+	animation_mode: EnumProperty(
+		name="Animation",
+		description="How turns are animated",
+		items=[("KEYFRAMES", "Keyframes", "Key every turning block"),
+			   ("PIVOT", "Pivot", "Key one pivot empty per turn, blocks follow it with constraints")
 			   ]
 	)
 
@@ -540,33 +2886,142 @@ class RC_OT_Rotate(Operator):
 	bl_idname = "rubik.operator_rotate"
 	bl_options = {'REGISTER', 'UNDO'}
 
-	rubik_cube_to_rotate = None
+	# Copied from the panel in invoke, the redo panel changes these and runs execute again
+	angle: IntProperty(
+		name="Angle",
+		description="Angle to rotate the Cube's part",
+		default=90,
+		min=-180,
+		max=180
+	)
 
+	axis: EnumProperty(
+		name="Axis",
+		description="Axis to rotate selected cube's part",
+		items=ROTATE_AXIS_ITEMS
+	)
+
+	@classmethod
+	def poll(cls, context):
+		return find_rubik_cube(context.active_object) is not None
+
+	def invoke(self, context, event):
+		self.angle = context.scene.cube_rotate_props.angle
+		self.axis = context.scene.cube_rotate_props.axis_enum
+		return self.execute(context)
+
+	# Only data API edits, no nested operators, so the whole turn is one light undo step.
+	# The cube is found here and not in invoke because redo calls only execute
 	def execute(self, context):
-		angle = context.scene.cube_rotate_props.angle
-		axis = context.scene.cube_rotate_props.axis_enum
 		cube_to_rotate = context.active_object
+		rubik_cube = find_rubik_cube(cube_to_rotate)
+		if rubik_cube is None or cube_to_rotate.name not in rubik_cube.cubie_indices:
+			return {'CANCELLED'}
 
-		self.rubik_cube_to_rotate.update()
-		self.rubik_cube_to_rotate.rotate(cube_to_rotate.name, axis, angle)
+		rubik_cube.frames_per_turn = context.scene.cube_rotate_props.frames
+		rubik_cube.easing = context.scene.cube_rotate_props.easing
+		rubik_cube.animation_mode = context.scene.cube_rotate_props.animation_mode
+
+		try:
+			rubik_cube.rotate(cube_to_rotate.name, self.axis, self.angle)
+		except ValueError as error:
+			self.report({'ERROR'}, str(error))
+			return {'CANCELLED'}
 
 		return {'FINISHED'}
 
-	def invoke(self, context, event):
-		global all_rubik_cubes
-		parent_object = context.active_object.parent
-		self.rubik_cube_to_rotate = None
 
-		for rubik_cube in all_rubik_cubes:
-			if parent_object.name == rubik_cube.parent_object_name:
-				self.rubik_cube_to_rotate = rubik_cube
-				break
+class RC_OT_ApplySequence(Operator):
+	bl_label = "Apply Sequence"
+	bl_idname = "rubik.operator_apply_sequence"
+	bl_options = {'REGISTER', 'UNDO'}
 
-		if self.rubik_cube_to_rotate is not None:
-			return self.execute(context)
-		else:
+	def execute(self, context):
+		rubik_cube = find_rubik_cube(context.active_object)
+		if rubik_cube is None:
+			return {'CANCELLED'}
+
+		rubik_cube.frames_per_turn = context.scene.cube_rotate_props.frames
+		rubik_cube.easing = context.scene.cube_rotate_props.easing
+		rubik_cube.animation_mode = context.scene.cube_rotate_props.animation_mode
+
+		try:
+			rubik_cube.apply_sequence(context.scene.cube_rotate_props.sequence)
+		except ValueError as error:
+			self.report({'ERROR'}, str(error))
+			return {'CANCELLED'}
+
+		return {'FINISHED'}
+
+
+class RC_OT_Solve(Operator):
+	bl_label = "Solve"
+	bl_idname = "rubik.operator_solve"
+	bl_description = "Animate moves that solve the cube"
+	bl_options = {'REGISTER', 'UNDO'}
+
+	def execute(self, context):
+		rubik_cube = find_rubik_cube(context.active_object)
+		if rubik_cube is None:
 			return {'CANCELLED'}
 
+		rubik_cube.frames_per_turn = context.scene.cube_rotate_props.frames
+		rubik_cube.easing = context.scene.cube_rotate_props.easing
+		rubik_cube.animation_mode = context.scene.cube_rotate_props.animation_mode
+
+		# The state saved with every turn is the one at cube_keyframe, reading it back
+		# from the blocks would give the pose at the current frame of the timeline
+		try:
+			solution = rubik_cube.solution()
+			rubik_cube.apply_sequence(solution)
+		except ValueError as error:
+			self.report({'ERROR'}, str(error))
+			return {'CANCELLED'}
+
+		self.report({'INFO'}, "Solution: " + (solution or "already solved"))
+		return {'FINISHED'}
+
+
+def _update_profiling(self, context):
+	if self.enabled:
+		profiler.enable()
+	else:
+		profiler.disable()
+
+
+class OperatorProfileProperties(bpy.types.PropertyGroup):
+	enabled: BoolProperty(
+		name="Profile",
+		description="Time the addon's build and turn phases and count operator calls",
+		default=False,
+		update=_update_profiling
+	)
+
+
+class RC_OT_ClearProfile(Operator):
+	bl_label = "Clear"
+	bl_idname = "rubik.operator_clear_profile"
+	bl_description = "Forget the measured times and counts"
+
+	def execute(self, context):
+		profiler.clear()
+		return {'FINISHED'}
+
+
+class RC_OT_BakePivots(Operator):
+	bl_label = "Bake Pivots"
+	bl_idname = "rubik.operator_bake_pivots"
+	bl_description = "Replace pivot empties of the cube with keyframes on its blocks"
+	bl_options = {'REGISTER', 'UNDO'}
+
+	def execute(self, context):
+		rubik_cube = find_rubik_cube(context.active_object)
+		if rubik_cube is None:
+			return {'CANCELLED'}
+
+		rubik_cube.bake_pivots()
+		return {'FINISHED'}
+
 
 # Panel for Rubik's cube ##############################################
 class View3DPanel:
@@ -588,6 +3043,11 @@ class RubikCubeBuildPanel(View3DPanel, bpy.types.Panel):
 		scene = context.scene
 
 		self.layout.prop(scene.cube_build_props, "size")
+		self.layout.prop(scene.cube_build_props, "strategy")
+		if scene.cube_build_props.strategy != 'PRIMITIVE':
+			self.layout.prop(scene.cube_build_props, "resolution")
+		self.layout.prop(scene.cube_build_props, "fast")
+		self.layout.prop(scene.cube_build_props, "hollow")
 		self.layout.operator("rubik.operator_build")
 
 		self.layout.label(text="", icon_value=custom_icons["cube_icon"].icon_id)
@@ -602,25 +3062,91 @@ class RubikCubeRotatePanel(View3DPanel, bpy.types.Panel):
 
 		self.layout.prop(scene.cube_rotate_props, "angle")
 		self.layout.prop(scene.cube_rotate_props, "axis_enum")
+		self.layout.prop(scene.cube_rotate_props, "frames")
+		self.layout.prop(scene.cube_rotate_props, "easing")
+		self.layout.prop(scene.cube_rotate_props, "animation_mode")
 		self.layout.operator("rubik.operator_rotate")
 
+		self.layout.prop(scene.cube_rotate_props, "sequence")
+		self.layout.operator("rubik.operator_apply_sequence")
+		self.layout.operator("rubik.operator_solve")
+		self.layout.operator("rubik.operator_bake_pivots")
+
+
+class RubikCubeProfilePanel(View3DPanel, bpy.types.Panel):
+	bl_idname = "VIEW3D_PT_profile_cube"
+	bl_label = "Profile Rubik's Cube"
+
+	def draw(self, context):
+		self.layout.prop(context.scene.cube_profile_props, "enabled")
+		self.layout.operator("rubik.operator_clear_profile")
+
+		column = self.layout.column(align=True)
+		for label, (calls, seconds) in sorted(profiler.phases.items(), key=lambda item: -item[1][1]):
+			column.label(text="%s: %d x, %.1f ms" % (label, calls, seconds * 1000))
+		for idname, (calls, seconds) in sorted(profiler.operators.items(), key=lambda item: -item[1][1]):
+			column.label(text="bpy.ops.%s: %d x, %.1f ms" % (idname, calls, seconds * 1000))
+		column.label(text="Depsgraph updates: %d, frame changes: %d" % (profiler.depsgraph_updates, profiler.frame_changes))
+		column.label(text="Objects: %d" % len(bpy.data.objects))
+
 
 classes = (
 	RC_OT_Build,
 	RC_OT_Rotate,
+	RC_OT_ApplySequence,
+	RC_OT_Solve,
+	RC_OT_BakePivots,
+	RC_OT_ClearProfile,
 	OperatorBuildProperties,
 	OperatorRotateProperties,
+	OperatorProfileProperties,
 	RubikCubeBuildPanel,
-	RubikCubeRotatePanel
+	RubikCubeRotatePanel,
+	RubikCubeProfilePanel
 )
 
 custom_icons = None
 
 
+@persistent
+def invalidate_rubik_cubes(*args):
+	# Python side state may not match the restored objects anymore, find_rubik_cube
+	# makes the cubes again from the state saved on their parents
+	for rubik_cube in all_rubik_cubes.values():
+		rubik_cube.invalidate()
+	all_rubik_cubes.clear()
+
+	# update_node_cubes only plays back the known cubes, the Geometry Nodes ones are
+	# found once here and not on every frame
+	for obj in bpy.data.objects:
+		if obj.get("rubik_nodes"):
+			find_rubik_cube(obj)
+
+
+# The Profile flag is saved with the scene, but its update isn't called when a file is
+# loaded. Loading also drops the profiler's handlers, they aren't persistent, so the
+# profiler is switched off and on again as the loaded scene (or the environment) says
+@persistent
+def sync_profiling(*args):
+	enabled = bpy.context.scene.cube_profile_props.enabled or \
+		bool(bpy.app.background and os.environ.get(PROFILE_ENV_VARIABLE))
+	profiler.disable()
+	if enabled:
+		profiler.enable()
+
+
+# Geometry Nodes cubes aren't keyframed, their points are written for every frame
+@persistent
+def update_node_cubes(scene, *args):
+	for rubik_cube in list(all_rubik_cubes.values()):
+		if rubik_cube.node_turns is not None:
+			rubik_cube._write_nodes(scene.frame_current)
+
+
 def register():
 	# Register icons
 	from bpy.utils import register_class, register_tool, previews
-	global custom_icons
+	global custom_icons, solver_tables
 	import os
 	dir_path = os.path.dirname(os.path.realpath(__file__))
 
@@ -633,6 +3159,20 @@ def register():
 
 	bpy.types.Scene.cube_build_props = bpy.props.PointerProperty(type=OperatorBuildProperties)
 	bpy.types.Scene.cube_rotate_props = bpy.props.PointerProperty(type=OperatorRotateProperties)
+	bpy.types.Scene.cube_profile_props = bpy.props.PointerProperty(type=OperatorProfileProperties)
+
+	# Only the directory is set, the solver tables are mapped on the first solve
+	solver_tables = SolverTableCache(bpy.utils.user_resource('CONFIG', path="rubik_addon"))
+
+	for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post, bpy.app.handlers.load_post):
+		handlers.append(invalidate_rubik_cubes)
+	bpy.app.handlers.load_post.append(sync_profiling)
+	bpy.app.handlers.frame_change_pre.append(update_node_cubes)
+
+	profile_path = os.environ.get(PROFILE_ENV_VARIABLE)
+	if profile_path and bpy.app.background:
+		profiler.enable()
+		atexit.register(profiler.dump, profile_path)
 
 
 def unregister():
@@ -645,8 +3185,134 @@ def unregister():
 
 	del bpy.types.Scene.cube_build_props
 	del bpy.types.Scene.cube_rotate_props
+	del bpy.types.Scene.cube_profile_props
+	profiler.disable()
+
+	for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post, bpy.app.handlers.load_post):
+		if invalidate_rubik_cubes in handlers:
+			handlers.remove(invalidate_rubik_cubes)
+	if sync_profiling in bpy.app.handlers.load_post:
+		bpy.app.handlers.load_post.remove(sync_profiling)
+	if update_node_cubes in bpy.app.handlers.frame_change_pre:
+		bpy.app.handlers.frame_change_pre.remove(update_node_cubes)
+
+
+###############################################################
+# Headless batch jobs #########################################
+# blender -b -P rubik_addon.py -- jobs.json [results.jsonl]
+# The job file is a JSON list of jobs, every key is optional:
+# {"size": 3, "strategy": "PRIMITIVE", "fast": false, "hollow": false, "resolution": 16,
+#  "colors": {"White": [1, 1, 1, 1]},
+#  "scramble": "R U R'" or "random", "seed": 1, "frames_per_turn": 9,
+#  "camera": [7, -7, 6], "output": "/renders/cube_1.png", "animation": false}
+# Each finished job is written right away as one JSON line to results.jsonl or stdout
+def _aim_camera(scene, location, target):
+	camera = scene.camera
+	if camera is None:
+		camera = bpy.data.objects.new("RubikCamera", bpy.data.cameras.new("RubikCamera"))
+		scene.collection.objects.link(camera)
+		scene.camera = camera
+
+	camera.location = location
+	camera.rotation_euler = (Vector(target) - Vector(location)).to_track_quat('-Z', 'Y').to_euler()
+
+
+def _set_hidden(rubik_cube, hidden):
+	for obj in [rubik_cube.parent_object] + list(rubik_cube.parent_object.children):
+		obj.hide_render = hidden
+		obj.hide_viewport = hidden
+
+
+# Run one job. With cubes (dict kept between jobs) a cube built by an earlier job
+# with the same build settings is reset and reused, the other cubes are hidden
+def run_job(job, cubes=None):
+	size = job.get("size", 3)
+	strategy = job.get("strategy", "PRIMITIVE")
+	fast = job.get("fast", False) or size > CLASSIC_BUILD_MAX_SIZE
+	hollow = job.get("hollow", False)
+	resolution = job.get("resolution", 16)
+	colors = job.get("colors")
+	key = (size, strategy, fast, hollow, resolution, palette_hash(colors) if colors else None)
+
+	if cubes is not None and key in cubes:
+		rubik_cube = cubes[key]
+		rubik_cube.reset()
+	else:
+		builder_class = BLOCK_STRATEGIES[strategy]
+		if issubclass(builder_class, FancyCubeStrategy):
+			builder = builder_class(resolution=resolution, colors=colors)
+		else:
+			builder = builder_class(colors=colors)
+		rubik_cube = RubikCube(size, "RubikCube", builder, fast, hollow)
+		if cubes is not None:
+			cubes[key] = rubik_cube
+
+	if cubes is not None:
+		for other in cubes.values():
+			_set_hidden(other, other is not rubik_cube)
+
+	try:
+		# Not the reused cube's value, that is the one of the job before
+		rubik_cube.frames_per_turn = job.get("frames_per_turn", 9)
+		scramble = job.get("scramble", "")
+		if scramble == "random":
+			scramble = next(scrambles(size, 1, job.get("seed")))
+		rubik_cube.apply_sequence(scramble)
+
+		scene = bpy.context.scene
+		if "camera" in job:
+			_aim_camera(scene, job["camera"], rubik_cube._find_center_point())
+
+		output = job.get("output")
+		if output:
+			scene.render.filepath = output
+			if job.get("animation", False):
+				scene.frame_start = 1
+				scene.frame_end = rubik_cube.cube_keyframe
+				bpy.ops.render.render(animation=True)
+			else:
+				scene.frame_set(rubik_cube.cube_keyframe)
+				bpy.ops.render.render(write_still=True)
+
+		return {"size": size, "scramble": scramble, "output": output, "frames": rubik_cube.cube_keyframe}
+	finally:
+		if cubes is None:
+			rubik_cube.remove()
+
+
+def run_jobs(jobs_path, results_path=None):
+	with open(jobs_path) as file:
+		jobs = json.load(file)
+
+	results = open(results_path, 'w') if results_path else sys.stdout
+	# Built cubes by build settings, each is built once and reset for the next jobs
+	cubes = {}
+	try:
+		for index, job in enumerate(jobs):
+			start = time.perf_counter()
+			result = {"job": index}
+			try:
+				result.update(run_job(job, cubes))
+			except Exception as error:
+				# One broken job doesn't stop the batch, whatever it got wrong (like "size": "4")
+				result["error"] = type(error).__name__ + ": " + str(error)
+
+			result["seconds"] = round(time.perf_counter() - start, 3)
+			results.write(json.dumps(result) + "\n")
+			results.flush()
+	finally:
+		for rubik_cube in cubes.values():
+			rubik_cube.remove()
+		if results is not sys.stdout:
+			results.close()
 
 
 if __name__ == "__main__":
 	register()
 
+	# Arguments after "--" are left for the script by Blender
+	if bpy.app.background and "--" in sys.argv:
+		arguments = sys.argv[sys.argv.index("--") + 1:]
+		if arguments:
+			run_jobs(*arguments[:2])
+
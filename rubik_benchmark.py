@@ -0,0 +1,209 @@
+# Benchmarks of rubik_addon, results are written as JSON so runs can be compared
+#
+# In Blender (build, turns, sequences, object and keyframe counts):
+#   blender -b -P rubik_benchmark.py -- --sizes 2 3 4 5 6 --output blender.json
+# In plain Python with a stand-in for bpy and mathutils (the parts without bpy access:
+# CubieState, CubeState, parse_moves, solver, scrambles):
+#   python rubik_benchmark.py --sizes 2 3 4 5 6 --output logic.json
+
+import argparse, gc, json, os, platform, random, sys, time, tracemalloc, types
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+
+# Just enough of bpy and mathutils for rubik_addon to import, nothing that needs
+# Blender can run with it
+def install_standin():
+	bpy = types.ModuleType("bpy")
+	bpy.types = types.ModuleType("bpy.types")
+	bpy.props = types.ModuleType("bpy.props")
+	bpy.utils = types.ModuleType("bpy.utils")
+	bpy.app = types.ModuleType("bpy.app")
+	bpy.app.handlers = types.ModuleType("bpy.app.handlers")
+	bpy.app.background = True
+	bpy.app.handlers.persistent = lambda function: function
+
+	for name in ("Operator", "Panel", "PropertyGroup"):
+		setattr(bpy.types, name, type(name, (), {}))
+	for name in ("StringProperty", "BoolProperty", "IntProperty", "FloatProperty",
+				 "FloatVectorProperty", "EnumProperty", "PointerProperty"):
+		setattr(bpy.props, name, lambda *args, **kwargs: None)
+
+	mathutils = types.ModuleType("mathutils")
+	for name in ("Matrix", "Vector", "Euler"):
+		setattr(mathutils, name, type(name, (), {}))
+
+	sys.modules.update({"bpy": bpy, "bpy.types": bpy.types, "bpy.props": bpy.props, "bpy.utils": bpy.utils,
+						"bpy.app": bpy.app, "bpy.app.handlers": bpy.app.handlers, "mathutils": mathutils})
+
+
+def import_addon():
+	sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+	import rubik_addon
+	return rubik_addon
+
+
+# Best and mean time of repeat calls
+def measure(function, repeat=1):
+	times = []
+	gc.collect()
+	for i in range(repeat):
+		start = time.perf_counter()
+		function()
+		times.append(time.perf_counter() - start)
+
+	return {"best": min(times), "mean": sum(times) / len(times), "repeat": repeat}
+
+
+# Peak of Python allocations during the call, a separate run because tracing slows it down
+def peak_memory(function):
+	gc.collect()
+	tracemalloc.start()
+	function()
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return peak
+
+
+# Resident memory of the process, Blender allocates most of its data on the C side
+# where tracemalloc doesn't see it. None where /proc isn't there
+def resident_bytes():
+	try:
+		with open("/proc/self/statm") as file:
+			return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (OSError, ValueError, AttributeError):
+		return None
+
+
+def sequence(ra, size, length=100):
+	return ra.random_move_scramble(size, random.Random(size), length)
+
+
+def bench_logic(ra, sizes, results):
+	for size in sizes:
+		moves_text = sequence(ra, size)
+		moves = ra.parse_moves(moves_text, size)
+
+		results.append(dict(name="parse_moves_100", size=size,
+							**measure(lambda: ra.parse_moves(moves_text, size), 20)))
+		results.append(dict(name="cubie_state_100_moves", size=size,
+							**measure(lambda: ra.apply_moves(ra.CubieState(size), moves), 10)))
+		results.append(dict(name="facelet_colors", size=size,
+							**measure(lambda: ra.facelet_colors(ra.CubieState(size)), 10)))
+
+		ra._MOVE_PERMUTATIONS.clear()
+		results.append(dict(name="sticker_permutation_100_moves", size=size,
+							**measure(lambda: ra.sequence_permutation(size, moves), 1)))
+		permutation = ra.sequence_permutation(size, moves)
+		results.append(dict(name="sticker_state_apply", size=size,
+							**measure(lambda: ra.CubeState(size).apply_permutation(permutation), 100)))
+
+		if size > 3:
+			rng = random.Random(0)
+			results.append(dict(name="random_move_scramble", size=size,
+								**measure(lambda: ra.random_move_scramble(size, rng), 10)))
+
+	# A new cache loads the saved tables, or builds and saves them if there are none
+	directory = ra.solver_tables.directory
+	built = ra.SolverTableCache(directory).load() is None
+	timing = measure(lambda: ra.SolverTableCache(directory).solver(), 1)
+	results.append(dict(name="solver_tables", size=3, built=built,
+						peak_bytes=peak_memory(lambda: ra.SolverTableCache(directory).solver()), **timing))
+
+	rng = random.Random(0)
+	solver = ra.solver_tables.solver()
+	cubes = [ra.random_cubie_cube(rng) for i in range(20)]
+	results.append(dict(name="solve_random_state", size=3, **measure(lambda: solver.solve(cubes.pop()), 20)))
+
+
+def count_keyframes(bpy):
+	return sum(len(fcurve.keyframe_points) for action in bpy.data.actions for fcurve in action.fcurves)
+
+
+def bench_blender(ra, sizes, strategy, results):
+	import bpy
+
+	for size in sizes:
+		for fast in (False, True):
+			if not fast and size > ra.CLASSIC_BUILD_MAX_SIZE:
+				continue
+
+			def build():
+				built.append(ra.RubikCube(size, "Benchmark", ra.BLOCK_STRATEGIES[strategy](), fast))
+
+			# The first build also makes the shared materials
+			built = []
+			build()
+			built.pop().remove()
+
+			objects_before = len(bpy.data.objects)
+			resident_before = resident_bytes()
+			timing = measure(build)
+			resident = resident_bytes()
+			rubik_cube = built.pop()
+			common = dict(size=size, fast=fast, strategy=strategy)
+			results.append(dict(name="build", objects=len(bpy.data.objects) - objects_before,
+								resident_bytes=resident - resident_before if resident is not None else None,
+								**common, **timing))
+
+			cubie = next(name for name in rubik_cube.cubie_names if name is not None)
+			results.append(dict(name="rotate", **common, **measure(lambda: rubik_cube.rotate(cubie, 'X', 90), 8)))
+
+			# Only the keys the sequence adds, the rotate turns above are keyed too
+			moves = sequence(ra, size)
+			keyframes_before = count_keyframes(bpy)
+			timing = measure(lambda: rubik_cube.apply_sequence(moves))
+			results.append(dict(name="apply_sequence_100", keyframes=count_keyframes(bpy) - keyframes_before,
+								**common, **timing))
+
+			results.append(dict(name="reset", **common, **measure(rubik_cube.reset)))
+			rubik_cube.remove()
+
+
+def main(argv):
+	parser = argparse.ArgumentParser(description="Benchmarks of rubik_addon")
+	parser.add_argument("--sizes", type=int, nargs="+", default=[2, 3, 4, 5, 6])
+	parser.add_argument("--strategy", default="PRIMITIVE")
+	parser.add_argument("--output", help="JSON file, printed when missing")
+	parser.add_argument("--standin", action="store_true", help="use the bpy stand-in even if bpy can be imported")
+	args = parser.parse_args(argv)
+
+	try:
+		if args.standin:
+			raise ImportError
+		import bpy
+		in_blender = hasattr(bpy, "data")
+	except ImportError:
+		install_standin()
+		in_blender = False
+
+	ra = import_addon()
+	results = []
+	if in_blender:
+		bench_blender(ra, args.sizes, args.strategy, results)
+	bench_logic(ra, args.sizes, results)
+
+	report = {
+		"mode": "blender" if in_blender else "standin",
+		"python": platform.python_version(),
+		"blender": ".".join(map(str, sys.modules["bpy"].app.version)) if in_blender else None,
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		# Kilobytes on Linux, bytes on macOS
+		"max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+		"results": results
+	}
+
+	text = json.dumps(report, indent=1)
+	if args.output:
+		with open(args.output, 'w') as file:
+			file.write(text)
+	else:
+		print(text)
+
+
+if __name__ == "__main__":
+	# Blender leaves the arguments after "--" to the script
+	main(sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:])
@@ -0,0 +1,82 @@
+# Logic of rubik_addon without bpy access, run with the stand-in for bpy of
+# rubik_benchmark.py:
+#   python -m pytest tests
+import os, random, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rubik_benchmark
+
+rubik_benchmark.install_standin()
+ra = rubik_benchmark.import_addon()
+
+
+def scrambled(size, sequence):
+	return ra.apply_moves(ra.CubieState(size), ra.parse_moves(sequence, size))
+
+
+def solves(state, solution):
+	turned = ra.apply_moves(state.copy(), ra.parse_moves(solution, state.size))
+	return ra.CubeState.from_cubie_state(turned).is_solved()
+
+
+# Wide, slice, whole cube and plain face moves in every notation parse_moves knows
+MIXED_SEQUENCES = {
+	2: "R U' F2 x y2 z' Rw L'",
+	3: "R U' F2 x y2 z' Rw 2L' M E2 S'",
+	4: "R U' F2 x y2 z' Rw 3Fw2 2L' r'",
+	5: "R U' F2 x y2 z' Rw 3Fw2 2L' 3U M",
+	6: "R U' F2 x y2 z' Rw 3Fw2 2L' 3U 4Dw' l2 b"
+}
+
+
+@pytest.mark.parametrize("size", [2, 3, 4, 5, 6])
+def test_format_moves_round_trips(size):
+	sequence = ra.random_move_scramble(size, random.Random(size), 40)
+	assert ra.format_moves(ra.parse_moves(sequence, size), size) == sequence
+
+	moves = ra.parse_moves(MIXED_SEQUENCES[size], size)
+	again = ra.parse_moves(ra.format_moves(moves, size), size)
+	assert (ra.sequence_permutation(size, again) == ra.sequence_permutation(size, moves)).all()
+
+
+def test_format_moves_drops_whole_turns():
+	assert ra.format_moves([('X', (2,), 4), ('Y', (0,), 0), ('Z', (0, 1, 2), -4)], 3) == ''
+
+
+@pytest.mark.parametrize("size", [2, 3, 4, 5, 6])
+def test_sticker_state_agrees_with_cubie_state(size):
+	sequence = MIXED_SEQUENCES[size] + " " + ra.random_move_scramble(size, random.Random(size), 40)
+	stickers = ra.CubeState(size).apply_sequence(sequence)
+	assert stickers == ra.CubeState.from_cubie_state(scrambled(size, sequence))
+	assert stickers.is_valid() and not stickers.is_solved()
+
+
+@pytest.mark.parametrize("size", [2, 3])
+def test_random_state_scrambles_are_repeatable(size):
+	first = list(ra.scrambles(size, 3, seed=1))
+	assert first == list(ra.scrambles(size, 3, seed=1))
+	for sequence in first:
+		assert not ra.CubeState(size).apply_sequence(sequence).is_solved()
+
+
+@pytest.mark.parametrize("size", [2, 3, 4, 5, 6])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_solution_solves_the_scramble(size, seed):
+	sequence = next(ra.scrambles(size, 1, seed))
+	state = scrambled(size, MIXED_SEQUENCES[size] + " " + sequence)
+	solution = ra.solve_state(state) if size <= 3 else ra.solve_reduction(state)
+	assert solves(state, solution)
+
+
+# Scrambles the greedy commutator search of solve_reduction used to get stuck on
+@pytest.mark.parametrize("size, seed", [(4, 11), (5, 6), (5, 13), (6, 24)])
+def test_reduction_doesnt_get_stuck(size, seed):
+	state = scrambled(size, ra.random_move_scramble(size, random.Random(seed), 150))
+	assert solves(state, ra.solve_reduction(state))
+
+
+def test_reduction_refuses_big_cubes():
+	with pytest.raises(ValueError):
+		ra.solve_reduction(ra.CubieState(ra.REDUCTION_MAX_SIZE + 1))